@@ -1,59 +1,119 @@
 #!/usr/bin/env python
 #
+# delete the old Mentat session files (mentat.log, mentat.N.log,
+# mentat.proc, mentat.N.proc) of the working folder
+#
+# the folder is listed once with os.scandir and the names are matched
+# with PATTERN, so any session number is found; the files are deleted
+# in batches by a pool of threads (faster on network shares, where each
+# delete is a round trip) and the reclaimed bytes are reported.
+# the files of the running session cannot be deleted: they are passed
+# to daemon_delete.py, which waits for Mentat to exit.
+#
 from py_mentat import *
 import os
+import re
 import sys
 
-#import threading
-#import multiprocessing as mp
-import time 
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Mentat session files: mentat.log, mentat.12.proc, ...
+PATTERN = re.compile(r'^mentat(\.\d+)?\.(log|proc)$', re.IGNORECASE)
+# files per batch and number of threads deleting batches
+BATCH = 64
+WORKERS = 8
+
+
+def find_files(directory):
+    # (path, size) of the session files of directory
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if PATTERN.match(entry.name) and entry.is_file(follow_symlinks=False):
+                try:
+                    files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+                except OSError:
+                    pass
+    return files
+
+
+def delete_batch(files):
+    # delete a batch of files; (bytes reclaimed, paths not deleted)
+    reclaimed = 0
+    failed = []
+    for path, size in files:
+        try:
+            os.remove(path)
+            reclaimed += size
+        except FileNotFoundError:
+            pass
+        except OSError:
+            failed.append(path)
+    return reclaimed, failed
+
+
+def delete_files(files, workers=WORKERS, batch=BATCH):
+    # delete the files in batches over a pool of threads
+    batches = [files[k:k + batch] for k in range(0, len(files), batch)]
+    reclaimed = 0
+    failed = []
+    if not batches:
+        return reclaimed, failed
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        for r, f in pool.map(delete_batch, batches):
+            reclaimed += r
+            failed += f
+    return reclaimed, failed
+
+
+def size_text(n):
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return "%d %s" % (n, unit) if unit == 'bytes' else "%.1f %s" % (n, unit)
+        n /= 1024.0
+
+
+def delete_later(filename):
+    # daemon_delete.py deletes filename (.log) and its .proc when the
+    # Mentat session using them exits
+    fileo = open("tempfile", "w")
+    fileo.write(filename)
+    fileo.close()
+
+    py_send("*py_echo off *set_proc_echo off")
+    py_send("*py_separate_process on")
+    dir1 = os.path.dirname(os.path.abspath(__file__))
+    percorso = os.path.join(dir1, "daemon_delete.py")
+    print("percorso", percorso)
+    if os.path.exists(percorso):
+        py_send("*py_file_run %s %s" % (percorso, filename))
+    else:
+        print("worng path ", percorso)
+    py_send("*py_echo on *set_proc_echo on")
+    py_send("|")
+    py_send("| run completed")
 
 
 def main():
 
     py_send("*py_separate_process off")
     directory = py_get_string("getcwd()")
-    
-    for i in range(100):
-        if i==0:
-            filename = os.path.join(directory, "mentat.log")
-        
-        else:
-            filename = os.path.join(directory, "mentat." + str(i) + ".log")
-        
-        filename2 = filename.replace(".log",".proc")
-        
-        if os.path.exists(filename) or os.path.exists(filename2):
-            try:
-                if os.path.exists(filename):  os.remove(filename)
-                if os.path.exists(filename2): os.remove(filename2)
-            except:
-                print("cannot remove", filename)
-                ultimo=filename
-
-                fileo =open("tempfile","w")
-                fileo.write(ultimo)
-                fileo.close()
-
-                # py_send("*py_call_arguments %s" % ultimo)
-                py_send("*py_echo off *set_proc_echo off")
-                py_send("*py_separate_process on")
-                dir1 = os.path.dirname(os.path.abspath(__file__))
-                percorso = os.path.join(dir1,"daemon_delete.py")
-                print("percorso", percorso)
-                if os.path.exists(percorso):    
-                    py_send("*py_file_run %s %s" % (percorso,ultimo ))
-                else:
-                    print("worng path ", percorso)
-                #py_send("*py_separate_process off")
-                py_send("*py_echo on *set_proc_echo on")
-                py_send("|")
-                py_send("| run completed")
-    
-
-    return 
+
+    files = find_files(directory)
+    reclaimed, failed = delete_files(files)
+    print("Deleted %d of %d Mentat session files, %s reclaimed"
+          % (len(files) - len(failed), len(files), size_text(reclaimed)))
+
+    if failed:
+        # files in use: the running session
+        for path in failed:
+            print("cannot remove", path)
+        ultimo = failed[-1]
+        if ultimo.lower().endswith(".proc"):
+            ultimo = ultimo[:-5] + ".log"
+        delete_later(ultimo)
+
+    return
 
 if __name__ == '__main__':
     main()
-
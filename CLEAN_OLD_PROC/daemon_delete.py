@@ -19,7 +19,8 @@ def cancella(filename, id1):
                 os.remove(filename)
 
                 print("fatto",filename)
-                break
+            # already deleted (e.g. the .log by clean_old_proc)
+            break
         except:
             # print("child ", mp.current_process().pid)
             if id1 == 2:
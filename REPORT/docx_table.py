@@ -0,0 +1,83 @@
+# ---------------------------------------------------------------------
+# description
+# fast table writer for the Word reports
+#
+# python-docx adds a table row with table.add_row().cells, which walks
+# the whole table xml for every row and every cell: the time grows with
+# the square of the number of rows and a table of a few thousand rows
+# takes minutes. here the xml of the whole table is written as one
+# string and parsed once, so 10^4 rows take a fraction of a second.
+#
+# usage
+#   import docx_table
+#   docx_table.add_table(document, ['Material Name', 'Type', 'Young'],
+#                        [['steel', 'standard', 210000.0], ...])
+#
+# Notes:
+# the table gets the same xml as document.add_table(rows, cols, style)
+# with the cell texts set: same style, column widths and cell widths.
+# the header row is repeated on every page.
+# the values are written with str(), a line break in a text is kept.
+# python-docx is imported when a table is added; with a deferred
+# document (report_document.py) the table is built at save time.
+# ---------------------------------------------------------------------
+from xml.sax.saxutils import escape
+
+# twips (1/20 pt) in one EMU unit
+EMU_PER_TWIP = 635
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def cell_xml(value, width):
+    # xml of one cell with one paragraph
+    text = '' if value is None else str(value)
+    if text:
+        runs = '<w:br/>'.join('<w:t xml:space="preserve">%s</w:t>' % escape(t)
+                              for t in text.split('\n'))
+        par = '<w:p><w:r>%s</w:r></w:p>' % runs
+    else:
+        par = '<w:p/>'
+    return '<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="%d"/></w:tcPr>%s</w:tc>' % (width, par)
+
+
+def table_xml(header, rows, widths, style_id=None):
+    # xml of the whole table, header row first
+    parts = ['<w:tbl xmlns:w="%s"><w:tblPr>' % W_NS]
+    if style_id:
+        parts.append('<w:tblStyle w:val="%s"/>' % style_id)
+    parts.append('<w:tblW w:type="auto" w:w="0"/>'
+                 '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" '
+                 'w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr>')
+    parts.append('<w:tblGrid>%s</w:tblGrid>' % ''.join('<w:gridCol w:w="%d"/>' % w for w in widths))
+    if header is not None:
+        parts.append('<w:tr><w:trPr><w:tblHeader/></w:trPr>%s</w:tr>'
+                     % ''.join(cell_xml(v, w) for v, w in zip(header, widths)))
+    for row in rows:
+        parts.append('<w:tr>%s</w:tr>' % ''.join(cell_xml(v, w) for v, w in zip(row, widths)))
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+
+def add_table(document, header, rows, style='Table Grid', widths=None):
+    # add a table at the end of the document and return it as a
+    # python-docx Table; widths are the column widths in twips
+    # (default: page width shared equally, as document.add_table)
+    if hasattr(document, 'defer'):
+        return document.defer(add_table, header, list(rows), style, widths)
+    from docx.oxml import parse_xml
+    from docx.table import Table
+    rows = list(rows)
+    ncol = len(header) if header is not None else max((len(r) for r in rows), default=1)
+    if widths is None:
+        section = document.sections[-1]
+        block = section.page_width - section.left_margin - section.right_margin
+        widths = [int(block / ncol / EMU_PER_TWIP)] * ncol
+    style_id = document.styles[style].style_id if style else None
+    tbl = parse_xml(table_xml(header, rows, widths, style_id))
+    # the table goes before the section properties at the end of the body
+    body = document.element.body
+    if body.sectPr is not None:
+        body.sectPr.addprevious(tbl)
+    else:
+        body.append(tbl)
+    return Table(tbl, document._body)
@@ -0,0 +1,80 @@
+# ---------------------------------------------------------------------
+# description
+# element census of a Mentat model for the model report: the class,
+# type, contact body, geometry, orientation and material of every
+# element are read in one batch and counted with numpy, e.g. the
+# number of elements of each type x material x geometry
+#
+# usage
+#   import element_census
+#   columns = element_census.read_elements()
+#   rows = element_census.census(columns, ('type', 'mater', 'geom'))
+#   # rows = [[type, material, geometry, # elements], ...]
+#
+# Notes:
+# every attribute is one series query over the element ids (see
+# mentat_query.py): inside Mentat, not one round trip per element. the
+# names (material, geometry, ...) come back as codes in a list of
+# distinct names, so a model with millions of elements moves a few
+# integer columns.
+# the counts are one np.unique over the combined codes of the
+# attributes, no python loop over the elements.
+# elements with no material (geometry, ...) have the name '-'.
+# ---------------------------------------------------------------------
+import numpy as np
+
+import mentat_query
+from mentat_query import INT, CODE
+
+# attribute: (kind, Mentat function of the element id)
+ATTRIBUTES = {'class': (INT, "element_class(%d)"),
+              'family': (INT, "element_family(%d)"),
+              'type': (INT, "element_type(%d)"),
+              'cbody': (CODE, "element_cbody(%d)"),
+              'geom': (CODE, "element_geom(%d)"),
+              'orient': (CODE, "element_orient(%d)"),
+              'mater': (CODE, "element_mater(%d)")}
+# titles of the table columns
+TITLES = {'class': 'Class', 'family': 'Family', 'type': 'Element Type', 'cbody': 'Contact Body',
+          'geom': 'Geometry', 'orient': 'Orientation', 'mater': 'Material'}
+
+
+def read_elements(attributes=tuple(ATTRIBUTES)):
+    # {attribute: (names, codes)} of all the elements; for the integer
+    # attributes the names are the distinct values
+    n = mentat_query.get(INT, "nelements()")
+    queries = [ATTRIBUTES[a] + (n, "element_id(%d)") for a in attributes]
+    answers = mentat_query.bulk(queries) if n > 0 else [[] for a in attributes]
+    columns = {}
+    for a, values in zip(attributes, answers):
+        if ATTRIBUTES[a][0] == CODE:
+            names, codes = values if n > 0 else ([], [])
+            names = [v or '-' for v in names]
+            codes = np.array(codes, dtype='i8')
+        else:
+            names, codes = np.unique(np.array(values, dtype='i8'), return_inverse=True)
+            names = [int(v) for v in names]
+        columns[a] = (names, codes)
+    return columns
+
+
+def census(columns, attributes=('type', 'mater', 'geom')):
+    # [value of each attribute..., # elements] of every combination
+    # found, by decreasing count
+    names = [columns[a][0] for a in attributes]
+    codes = [columns[a][1] for a in attributes]
+    if len(codes[0]) == 0:
+        return []
+    shape = [max(len(n), 1) for n in names]
+    combined = np.ravel_multi_index(codes, shape)
+    found, counts = np.unique(combined, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    index = np.unravel_index(found[order], shape)
+    rows = []
+    for k, c in enumerate(counts[order]):
+        rows.append([names[j][index[j][k]] for j in range(len(attributes))] + [int(c)])
+    return rows
+
+
+def header(attributes):
+    return [TITLES[a] for a in attributes] + ['Elements']
@@ -1,5 +1,7 @@
 
 
+import importlib.util
+import json
 import os
 import sys 
 
@@ -88,6 +90,83 @@ def installa_modulo():
             print("Error trying to install docx module\n")
             print("Please check that you can write into target folder : ", python_home )
 
+def lib_path():
+    current_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_path, "..", "PYTHON_LIB")
+
+
+def stamp_file():
+    # verified-environment stamp, written once docx imports fine
+    return os.path.join(lib_path(), "docx_env.json")
+
+
+def environment():
+    # what the stamp is valid for: this python and the PYTHON_LIB folder
+    return {"python": sys.executable, "version": sys.version, "lib": os.path.abspath(lib_path())}
+
+
+# shown when python-docx cannot be found after the install attempt
+MESSAGE = ("The python-docx package is not installed: run installa.bat (or pip install "
+           "python-docx --target PYTHON_LIB), exit from Mentat and run the report again.")
+
+
+# installa_modulo already run by this process
+_attempted = False
+
+
+def available():
+    # docx can be imported (found, not imported)
+    return importlib.util.find_spec("docx") is not None
+
+
+def bootstrap():
+    # True when docx can be imported, without importing it: the check
+    # (and the install) of installa_modulo runs once, only when the stamp
+    # is missing, written by another python or stale (package removed),
+    # and at most once per process
+    global _attempted
+    new_path = lib_path()
+    if new_path not in sys.path:
+        sys.path.append(new_path)
+    try:
+        with open(stamp_file()) as filei:
+            if json.load(filei) == environment() and available():
+                return True
+    except (OSError, ValueError):
+        pass
+    if not _attempted:
+        _attempted = True
+        installa_modulo()
+        importlib.invalidate_caches()
+    if not available():
+        if os.path.exists(stamp_file()):
+            os.remove(stamp_file())
+        return False
+    try:
+        with open(stamp_file(), "w") as fileo:
+            json.dump(environment(), fileo)
+    except OSError:
+        pass
+    return True
+
+
+def require_docx():
+    # called when a report starts, before the Mentat queries: False
+    # (and the message printed) when docx cannot be imported
+    if bootstrap():
+        return True
+    print(MESSAGE)
+    return False
+
+
+def import_docx():
+    # the docx package, imported when the document is saved
+    if not bootstrap():
+        raise ImportError(MESSAGE)
+    import docx
+    return docx
+
+
 if __name__ == "__main__":
     print("installo modulo ")
     installa_modulo()
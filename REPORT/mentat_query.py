@@ -0,0 +1,213 @@
+# ---------------------------------------------------------------------
+# description
+# bulk queries of the Mentat database functions for the report tools
+#
+# the reports ask Mentat for every attribute of every material,
+# boundary condition, contact body, set ... with one py_get_* call each.
+# when the script is connected through the socket (py_connect) every
+# call is a round trip, and a model with thousands of items takes
+# minutes. here the queries of a table are collected and sent as one
+# batch: the list is written to a file, Mentat runs this same module
+# on it (*py_file_run, so the calls are made inside Mentat) and writes
+# all the answers back to one file.
+#
+# usage
+#   import mentat_query
+#   mentat_query.connect('', 40007)      # instead of py_connect
+#   rows = mentat_query.table("nmaters()", "mater_name_index(%d)",
+#                             [(mentat_query.STRING, "mater_type(%s)"),
+#                              (mentat_query.FLOAT, "mater_par(%s,structural:youngs_modulus)")])
+#   # rows = [[name, type, young], ...]
+#   values = mentat_query.bulk([(mentat_query.INT, "nnodes()"),
+#                               (mentat_query.INT, "nelements()")])
+#   # a series of n values, expr with %d for 1..n, as one query:
+#   entries = mentat_query.series(mentat_query.INT, "set_entry(3,%d)", n)
+#   # or for the keys given by another expression, strings as codes:
+#   names, codes = mentat_query.series(mentat_query.CODE, "element_mater(%d)", n,
+#                                      over="element_id(%d)")
+#
+# Notes:
+# when the script runs inside Mentat (menu *py_file_run, with or
+# without connect) the calls are not round trips and are made one by
+# one: there py_mentat is built into Mentat, not a module file, and
+# connect() leaves the socket mode off.
+# py_mentat has no multi-request call: the batch costs three commands
+# (define the file name, run the batch, read the answers) whatever the
+# number of queries.
+# the answers are not cached: Mentat gives no indicator of the edits
+# made in the session and not saved yet (a material parameter, a set
+# entry), so an answer of a previous run may be stale even when the
+# model file is the same.
+# ---------------------------------------------------------------------
+import json
+import os
+import sys
+import tempfile
+import time
+
+from py_mentat import *
+
+INT = 'int'
+FLOAT = 'float'
+STRING = 'string'
+DATA = 'data'
+# strings of a series answered as (names, codes): the distinct strings
+# and the index of each value in them, compact for long series
+CODE = 'code'
+
+# set by connect(): True when the queries go through the socket
+SOCKET = False
+# largest wait for the answers of a batch, in seconds
+TIMEOUT = 600.0
+# Mentat parameter holding the name of the batch file
+BATCH_PARAM = 'mq_batch_file'
+
+
+
+def embedded():
+    # True when the script runs inside Mentat: the py_mentat module is
+    # then part of Mentat and has no file
+    return getattr(sys.modules.get('py_mentat'), '__file__', None) is None
+
+
+def connect(host='', port=40007):
+    # py_connect, and send the queries of a table as one batch from now
+    # when a client socket is opened (a script outside Mentat)
+    global SOCKET
+    py_connect(host, port)
+    SOCKET = not embedded()
+
+
+def disconnect():
+    global SOCKET
+    py_disconnect()
+    SOCKET = False
+
+
+def _get(kind, expr):
+    # value of one database function (one call)
+    if kind == INT:
+        return py_get_int(expr)
+    if kind == FLOAT:
+        return py_get_float(expr)
+    if kind == DATA:
+        return py_get_data(expr)
+    return py_get_string(expr)
+
+
+def _encode(values):
+    # (distinct values, index of each value)
+    names = {}
+    codes = [names.setdefault(v, len(names)) for v in values]
+    return list(names), codes
+
+
+def _answer(query, over_keys):
+    # value of a query, the list of values for (kind, expression, n) and
+    # (kind, expression, n, over); over_keys keeps the keys of the
+    # over expressions already asked in the batch
+    if len(query) == 2:
+        return _get(*query)
+    kind, expr, n = query[0:3]
+    keys = range(1, n + 1)
+    if len(query) == 4:
+        if (query[3], n) not in over_keys:
+            over_keys[query[3], n] = [py_get_int(query[3] % i) for i in keys]
+        keys = over_keys[query[3], n]
+    values = [_get(kind, expr % k) for k in keys]
+    return _encode(values) if kind == CODE else values
+
+
+def run_batch(queries):
+    # the answers of a list of queries (see bulk), one by one
+    over_keys = {}
+    return [_answer(q, over_keys) for q in queries]
+
+
+def _ask(queries):
+    # the answers of a list of (kind, expression) from Mentat, in one
+    # batch when connected through the socket
+    if not SOCKET or (len(queries) == 1 and len(queries[0]) == 2):
+        return run_batch(queries)
+    folder = tempfile.mkdtemp(prefix='mentat_query_')
+    path = os.path.join(folder, 'batch.json')
+    answer = path + '.out'
+    try:
+        with open(path, 'w') as fileo:
+            json.dump(queries, fileo)
+        # Mentat runs this module on the batch file (see main below)
+        py_send('*define %s "%s"' % (BATCH_PARAM, path))
+        py_send('*py_file_run "%s"' % os.path.abspath(__file__))
+        # the answers are written to a temporary file and renamed, so
+        # the file is complete when it appears
+        start = time.time()
+        wait = 0.001
+        while not os.path.exists(answer):
+            if time.time() - start > TIMEOUT:
+                raise RuntimeError('no answer from Mentat for %d queries' % len(queries))
+            time.sleep(wait)
+            wait = min(2 * wait, 0.1)
+        with open(answer) as filei:
+            return json.load(filei)
+    finally:
+        for f in (path, answer):
+            if os.path.exists(f):
+                os.remove(f)
+        os.rmdir(folder)
+
+
+def bulk(queries):
+    # the answers of a list of (kind, expression) or series (kind,
+    # expression, n), see series()
+    queries = [tuple(q) for q in queries]
+    if not queries:
+        return []
+    return _ask(queries)
+
+
+def get(kind, expr):
+    # value of one database function
+    return bulk([(kind, expr)])[0]
+
+
+def series(kind, expr, n, over=None):
+    # the values of expr % i for i = 1..n, e.g. all the entries of a set;
+    # with over, of expr % k for the keys k = over % i (e.g. element ids
+    # from "element_id(%d)"). kind CODE gives (names, codes)
+    if n <= 0:
+        return ([], []) if kind == CODE else []
+    if over is None:
+        return bulk([(kind, expr, n)])[0]
+    return bulk([(kind, expr, n, over)])[0]
+
+
+def keys(count_expr, key_expr, key_kind=STRING):
+    # the names (ids) of the items of a list, e.g. all materials:
+    #   keys("nmaters()", "mater_name_index(%d)")
+    n = get(INT, count_expr)
+    return bulk([(key_kind, key_expr % i) for i in range(1, n + 1)])
+
+
+def table(count_expr, key_expr, columns, key_kind=STRING):
+    # one row [key, value, ...] for every item of a list; columns is a
+    # list of (kind, expression with %s for the key)
+    names = keys(count_expr, key_expr, key_kind)
+    values = bulk([(kind, expr % (k,)) for k in names for kind, expr in columns])
+    ncol = len(columns)
+    return [[k] + values[i * ncol:(i + 1) * ncol] for i, k in enumerate(names)]
+
+
+def main():
+    # run inside Mentat by bulk(): answer the queries of the batch file
+    path = py_get_string(BATCH_PARAM)
+    with open(path) as filei:
+        queries = json.load(filei)
+    values = run_batch(queries)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fileo:
+        json.dump(values, fileo)
+    os.replace(tmp, path + '.out')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# ---------------------------------------------------------------------
+# description
+# rendering stage of the results report: the images needed by the
+# report, one per (quantity, increment, view), are kept in a cache
+# folder next to the post file and only the missing ones are rendered,
+# in parallel Mentat batch sessions
+#
+# usage
+#   import render_images
+#   jobs = render_images.image_jobs(['Displacement', 'Equivalent Von Mises Stress'],
+#                                   ['last'], ['default'])
+#   images = render_images.render('job1.t16', jobs, workers=4)
+#   # images = {(quantity, increment, view): png file}
+#
+# a quantity None is the model without contour (post off); the
+# increment is an increment number or 'last'; the view is a name of
+# VIEWS (Mentat commands run before the image is saved).
+#
+# Notes:
+# an image is found in the cache when the post file (path, size and
+# modification time), the quantity, the increment and the commands of
+# the view are the same, so a report of an unchanged job renders
+# nothing and a new run of the job renders everything again.
+# the missing images are split over workers Mentat sessions started
+# with MENTAT_BATCH and a procedure file each. with workers = 0, or
+# when Mentat cannot be started, they are rendered one by one in the
+# Mentat session of the calling script (py_send).
+# each image is saved to a temporary name and renamed when its session
+# ends normally; the temporary images of a session killed at TIMEOUT or
+# ended with an error are deleted and rendered in the calling session,
+# so an interrupted session leaves no half-written image in the cache.
+# ---------------------------------------------------------------------
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+
+# command line of a Mentat batch session running a procedure file
+# (appended), to adapt to the installation
+MENTAT_BATCH = ['mentat', '-bg', '-pr']
+# largest run time of a batch session, in seconds
+TIMEOUT = 1800
+# name of the cache folder, next to the post file
+CACHE_FOLDER = 'report_images'
+# Mentat commands of the views
+VIEWS = {'default': ['*fill_view']}
+# commands run once when the post file is opened
+SETUP = ['*system_grid_display_off', '*post_contour_bands']
+
+
+def image_jobs(quantities, increments=('last',), views=('default',)):
+    # (quantity, increment, view) of every image
+    return [(q, i, v) for q in quantities for i in increments for v in views]
+
+
+def fingerprint(post_file):
+    # path, size and modification time of the post file
+    st = os.stat(post_file)
+    return [os.path.abspath(post_file), st.st_size, st.st_mtime_ns]
+
+
+def cache_file(post_file, job, stamp=None):
+    # png file of an image in the cache folder
+    quantity, increment, view = job
+    key = [stamp or fingerprint(post_file), quantity, str(increment), VIEWS[view]]
+    name = hashlib.md5(json.dumps(key).encode()).hexdigest()
+    folder = os.path.join(os.path.dirname(os.path.abspath(post_file)), CACHE_FOLDER)
+    return os.path.join(folder, name + '.png')
+
+
+def image_commands(job, path):
+    # Mentat commands saving the image of a job to path
+    quantity, increment, view = job
+    if quantity is None:
+        cmds = ['*post_rewind', '*post_off']
+    else:
+        cmds = ['*post_value %s' % quantity]
+        if increment == 'last':
+            cmds.append('*post_skip_to_last')
+        else:
+            cmds.append('*post_skip_to %d' % int(increment))
+    return cmds + VIEWS[view] + ['*image_save_current "%s" yes' % path]
+
+
+def batch_procedure(post_file, jobs, paths):
+    # procedure file of one batch session
+    lines = ['*post_open "%s"' % os.path.abspath(post_file)] + SETUP
+    for job, path in zip(jobs, paths):
+        lines += image_commands(job, path)
+    lines += ['*post_close', '*quit yes']
+    return '\n'.join(lines) + '\n'
+
+
+def temporary(path):
+    return path[:-4] + '.tmp.png'
+
+
+def render_batches(post_file, jobs, paths, workers):
+    # render the jobs in workers Mentat batch sessions at the same time;
+    # the indices of the jobs of the sessions that failed (not started,
+    # killed at TIMEOUT or ended with an error), whose temporary images
+    # are deleted
+    folder = tempfile.mkdtemp(prefix='render_images_')
+    # (process, indices of its jobs) of every session
+    sessions = []
+    failed = []
+    try:
+        for w in range(workers):
+            part = list(range(w, len(jobs), workers))
+            if not part:
+                continue
+            proc = os.path.join(folder, 'batch_%d.proc' % w)
+            with open(proc, 'w') as fileo:
+                fileo.write(batch_procedure(post_file, [jobs[k] for k in part],
+                                            [temporary(paths[k]) for k in part]))
+            try:
+                sessions.append((subprocess.Popen(MENTAT_BATCH + [proc], cwd=folder,
+                                                  stdout=subprocess.DEVNULL,
+                                                  stderr=subprocess.DEVNULL), part))
+            except OSError:
+                failed += part
+        for p, part in sessions:
+            try:
+                p.wait(timeout=TIMEOUT)
+            except subprocess.TimeoutExpired:
+                p.kill()
+                p.wait()
+            if p.returncode != 0:
+                failed += part
+    finally:
+        for f in os.listdir(folder):
+            os.remove(os.path.join(folder, f))
+        os.rmdir(folder)
+    # the images of a failed session may be half written
+    for k in failed:
+        if os.path.exists(temporary(paths[k])):
+            os.remove(temporary(paths[k]))
+    return failed
+
+
+def render_session(post_file, jobs, paths):
+    # render the jobs one by one in the current Mentat session
+    from py_mentat import py_send
+    for cmd in SETUP:
+        py_send(cmd)
+    for job, path in zip(jobs, paths):
+        for cmd in image_commands(job, temporary(path)):
+            py_send(cmd)
+
+
+def render(post_file, jobs, workers=4):
+    # {job: png file} of the jobs, rendering only the images not in the
+    # cache
+    stamp = fingerprint(post_file)
+    images = {job: cache_file(post_file, job, stamp) for job in jobs}
+    missing = [job for job in jobs if not os.path.exists(images[job])]
+    print(" Images: %d in cache, %d to render" % (len(jobs) - len(missing), len(missing)))
+    if not missing:
+        return images
+    paths = [images[job] for job in missing]
+    os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+    # temporary images left by an interrupted report
+    for path in paths:
+        if os.path.exists(temporary(path)):
+            os.remove(temporary(path))
+    if workers > 0:
+        failed = render_batches(post_file, missing, paths, min(workers, len(missing)))
+        if failed:
+            print(" %d images of failed Mentat batch sessions, rendering in this session"
+                  % len(failed))
+    left = [k for k, path in enumerate(paths) if not os.path.exists(temporary(path))]
+    if left:
+        render_session(post_file, [missing[k] for k in left], [paths[k] for k in left])
+    for path in paths:
+        if os.path.exists(temporary(path)):
+            os.replace(temporary(path), path)
+    return {job: path for job, path in images.items() if os.path.exists(path)}
@@ -0,0 +1,217 @@
+# ---------------------------------------------------------------------
+# description
+# deferred Word document for the report tools: the calls made on the
+# document (add_heading, add_paragraph, add_run, add_picture, tables,
+# ...) are recorded while the report queries Mentat, and python-docx is
+# imported and the document built only when it is saved
+#
+# usage
+#   import report_document
+#   from report_document import lazy
+#   document = report_document.Document()
+#   d = document.add_heading("Report Model", 0)
+#   d.alignment = lazy('docx.enum.text', 'WD_ALIGN_PARAGRAPH.CENTER')
+#   p = document.add_paragraph('')
+#   p.add_run("text").bold = True
+#   document.add_picture('model.png', width=lazy('docx.shared', 'Inches', 6.0))
+#   docx_table.add_table(document, header, rows)
+#   document.save("report.docx")          # docx imported here
+#
+# Notes:
+# the objects returned by the calls are placeholders: methods can be
+# called and attributes set on them, attributes cannot be read (the
+# values do not exist before the save).
+# lazy(module, name, *args) is a value of python-docx (an enum, or a
+# call such as Inches(6.0)) resolved at save time.
+# the python-docx package is checked (and installed the first time) by
+# install_module_docx.require_docx when a report starts, see the stamp
+# in PYTHON_LIB.
+#
+# incremental reports: the document is split in sections, each with a
+# fingerprint of the data it shows; the sections unchanged since the
+# previous report (same file name) are not built again, their content
+# is kept from the previous document:
+#   document = report_document.Document(previous="report.docx")
+#   if document.section("Materials", rows):    # False: unchanged
+#       ... add the materials heading and table ...
+#   document.save("report.docx")               # False: nothing changed
+# the fingerprints and the number of body elements of every section are
+# kept in "<report>.sections.json" with the size and time of the report;
+# a report edited by hand is built again in full. a report with no
+# section changed is not written at all. delete the json file (or the
+# report) to build everything again, e.g. after a change of the report
+# script.
+# the section names are unique and a section does not use the objects
+# (paragraphs, tables) returned in another section.
+# ---------------------------------------------------------------------
+import hashlib
+import importlib
+import json
+import os
+
+import install_module_docx
+
+
+class lazy:
+    # value of python-docx resolved at save time
+
+    def __init__(self, module, name, *args):
+        self.module = module
+        self.name = name
+        self.args = args
+
+    def resolve(self):
+        value = importlib.import_module(self.module)
+        for part in self.name.split('.'):
+            value = getattr(value, part)
+        return value(*self.args) if self.args else value
+
+
+class Placeholder:
+    # object returned by a recorded call
+
+    def __init__(self, document, key):
+        object.__setattr__(self, '_document', document)
+        object.__setattr__(self, '_key', key)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self._document._record(('call', self._key, name), args, kwargs)
+        return call
+
+    def __setattr__(self, name, value):
+        self._document._ops.append((('set', self._key, name), (value,), {}, None))
+
+
+def fingerprint(*data):
+    # md5 of the data shown by a section
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def sections_file(filename):
+    return filename + '.sections.json'
+
+
+def file_stamp(filename):
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class Document(Placeholder):
+
+    def __init__(self, previous=None):
+        Placeholder.__init__(self, self, 0)
+        object.__setattr__(self, '_ops', [])
+        # [name, fingerprint, reused, first op] of every section
+        object.__setattr__(self, '_sections', [])
+        # previous report: {name: (fingerprint, # body elements)}
+        old = {}
+        if previous and os.path.exists(previous):
+            try:
+                with open(sections_file(previous)) as filei:
+                    data = json.load(filei)
+                if data['stamp'] == file_stamp(previous):
+                    old = {n: (f, k) for n, f, k in data['sections']}
+                    object.__setattr__(self, '_order', data['sections'])
+            except (OSError, ValueError, KeyError):
+                pass
+        object.__setattr__(self, '_previous', previous if old else None)
+        object.__setattr__(self, '_old', old)
+
+    def section(self, name, *data):
+        # start a section; True when it has to be built, False when it
+        # is the same as in the previous report
+        key = fingerprint(*data)
+        reused = self._old.get(name, (None,))[0] == key
+        self._sections.append([name, key, reused, len(self._ops)])
+        return not reused
+
+    def _record(self, op, args, kwargs):
+        key = len(self._ops) + 1
+        self._ops.append((op, args, kwargs, key))
+        return Placeholder(self, key)
+
+    def defer(self, func, *args, **kwargs):
+        # func(document, *args, **kwargs) called on the real document
+        # at save time, e.g. docx_table.add_table
+        return self._record(('defer', func), args, kwargs)
+
+    def _replay(self, objs, ops):
+        def value(v):
+            if isinstance(v, Placeholder):
+                return objs[v._key]
+            if isinstance(v, lazy):
+                return v.resolve()
+            return v
+        for op, args, kwargs, key in ops:
+            args = [value(a) for a in args]
+            kwargs = {k: value(v) for k, v in kwargs.items()}
+            if op[0] == 'set':
+                setattr(objs[op[1]], op[2], args[0])
+            elif op[0] == 'defer':
+                objs[key] = op[1](objs[0], *args, **kwargs)
+            else:
+                objs[key] = getattr(objs[op[1]], op[2])(*args, **kwargs)
+
+    def build(self):
+        # the python-docx document with the recorded calls replayed, and
+        # the number of body elements of every section
+        docx = install_module_docx.import_docx()
+        sections = self._sections
+        if not sections or sections[0][3] > 0:
+            # calls made before the first section
+            sections = [['', None, False, 0]] + sections
+        ends = [s[3] for s in sections[1:]] + [len(self._ops)]
+        if self._previous and any(s[2] for s in sections):
+            base = docx.Document(self._previous)
+        else:
+            base = docx.Document()
+        body = base.element.body
+        # body content of the previous report, by section
+        content = [e for e in body if e is not body.sectPr]
+        old = {}
+        pos = 0
+        if self._previous and any(s[2] for s in sections):
+            for n, f, k in self._order:
+                old[n] = content[pos:pos + k]
+                pos += k
+        for e in content:
+            body.remove(e)
+        objs = {0: base}
+        parts = []
+        for (name, key, reused, start), end in zip(sections, ends):
+            if reused:
+                parts.append(old[name])
+                continue
+            # the new elements are appended at the end of the body
+            self._replay(objs, self._ops[start:end])
+            new = [e for e in body if e is not body.sectPr]
+            for e in new:
+                body.remove(e)
+            parts.append(new)
+        for elements in parts:
+            for e in elements:
+                if body.sectPr is not None:
+                    body.sectPr.addprevious(e)
+                else:
+                    body.append(e)
+        counts = [[name, key, len(elements)] for (name, key, reused, start), elements
+                  in zip(sections, parts)]
+        return base, counts
+
+    def save(self, filename):
+        # write the report; False when no section changed and the
+        # previous report is kept as it is
+        sections = self._sections
+        if (self._previous and os.path.abspath(self._previous) == os.path.abspath(filename)
+                and sections and sections[0][3] == 0 and all(s[2] for s in sections)
+                and set(s[0] for s in sections) == set(self._old)):
+            return False
+        document, counts = self.build()
+        document.save(filename)
+        with open(sections_file(filename), 'w') as fileo:
+            json.dump({'stamp': file_stamp(filename), 'sections': counts}, fileo)
+        return True
@@ -0,0 +1,164 @@
+# ---------------------------------------------------------------------
+# description
+# headless results report: a Word document with the extreme values of
+# the results, read directly from the post file (.h5 or .t16), so it
+# runs as a batch job without Mentat and without a Mentat licence
+#
+# for every quantity and component the table gives the maximum and the
+# minimum over the analysis with the node (element) id, the integration
+# point and the increment where they occur
+#
+# usage
+# open CMD shell in the folder of the post file and then type:
+#   python report_headless.py job1.h5
+#   python report_headless.py job1.t16 -q "Displacement,Equivalent Von Mises Stress" -o report.docx
+# options:
+#   -q  quantity names (comma separated, default: all results)
+#   -i  increments, as first:last or a comma separated list (.h5 only)
+#   -o  output document (default report_<job>_results.docx)
+#
+# Notes:
+# .h5 files are streamed one increment at a time with the h5 tools
+# (see ../h5/extremes.py); each increment is reduced with one
+# argmax/argmin per component.
+# .t16 files are read with py_post (python of the Marc installation);
+# py_post has no bulk access, so the values of an increment are read
+# one by one into arrays and then reduced in the same way. element
+# values of a .t16 file are the values at the element nodes, the IP
+# column is then the element node.
+# no pictures: the contour plots need Mentat (report_results.py).
+# ---------------------------------------------------------------------
+import numpy as np
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "h5"))
+import extremes
+import marc_file
+
+import install_module_docx
+from report_document import Document, lazy
+import docx_table
+
+HEADER = ['Component', 'Max', 'Id', 'IP', 'Inc', 'Min', 'Id', 'IP', 'Inc']
+
+
+def h5_results(filename, quantities=None, incs=None):
+    # model description and extremes table rows of an h5 file
+    with marc_file.MarcFile(filename) as mf:
+        info = [('Title', mf.title or ''),
+                ('Precision', mf.precision),
+                ('Number of Nodes', int((mf.ids('node')[:, 0] > 0).sum())),
+                ('Number of Elements', int((mf.ids('element')[:, 0] > 0).sum())),
+                ('Number of Increments', int((mf.summary['INC'] >= 0).sum()))]
+    return info, extremes.extremes(filename, quantities, incs)
+
+
+def t16_values(p, kind, j, vector=False):
+    # ids and values (n, nip, ncol) of one result of the current
+    # increment of a py_post file
+    if kind == 'element':
+        n = p.elements()
+        ids = np.array([p.element_id(i) for i in range(n)], dtype='i8')
+        values = [[s.value for s in p.element_scalar(i, j)] for i in range(n)]
+        # elements with fewer nodes are padded with their first value,
+        # which never moves the argmax/argmin (first occurrence)
+        nip = max((len(v) for v in values), default=1)
+        data = np.array([v + v[0:1] * (nip - len(v)) for v in values], dtype='f8')
+        return ids, data[:, :, None]
+    n = p.nodes()
+    ids = np.array([p.node_id(i) for i in range(n)], dtype='i8')
+    if vector:
+        vec = [p.node_vector(i, j) for i in range(n)]
+        data = np.array([[v.x, v.y, v.z] for v in vec], dtype='f8')
+        data = np.concatenate([data, np.sqrt(np.einsum('ij,ij->i', data, data))[:, None]], axis=1)
+        return ids, data[:, None, :]
+    data = np.array([p.node_scalar(i, j) for i in range(n)], dtype='f8')
+    return ids, data[:, None, None]
+
+
+def t16_results(filename, quantities=None):
+    # model description and extremes table rows of a .t16 file
+    from py_post import post_open
+    p = post_open(filename)
+    p.moveto(1)
+    # (label, kind, index, vector) of the results of the file
+    results = [(p.node_vector_label(j), 'node', j, True) for j in range(p.node_vectors())]
+    results += [(p.node_scalar_label(j), 'node', j, False) for j in range(p.node_scalars())]
+    results += [(p.element_scalar_label(j), 'element', j, False) for j in range(p.element_scalars())]
+    if quantities:
+        labels = [r[0] for r in results]
+        missing = [q for q in quantities if q not in labels]
+        if missing:
+            print('  not found:', ', '.join(missing))
+        results = [r for r in results if r[0] in quantities]
+    acc = {}
+    for label, kind, j, vector in results:
+        acc[label] = extremes.Extremes(extremes.column_labels(3 if vector else 1, vector))
+    ninc = p.increments()
+    info = [('Number of Nodes', p.nodes()),
+            ('Number of Elements', p.elements()),
+            ('Number of Increments', ninc - 1)]
+    #
+    # -----------------------------loop over increments
+    for k in range(1, ninc):
+        p.moveto(k)
+        for label, kind, j, vector in results:
+            ids, values = t16_values(p, kind, j, vector)
+            acc[label].update(p.increment, p.time, ids, values)
+    p.close()
+    rows = []
+    for label, kind, j, vector in results:
+        rows += acc[label].rows(label)
+    return info, rows
+
+
+def write_report(filename, info, rows, output):
+    # Word document with the model description and one extremes table
+    # per quantity
+    document = Document()
+    d = document.add_heading("Report Results\n" + os.path.basename(filename), 0)
+    d.alignment = lazy('docx.enum.text', 'WD_ALIGN_PARAGRAPH.CENTER')
+    document.add_heading("Model description\n", 1)
+    p = document.add_paragraph('')
+    for name, value in info:
+        p.add_run(" %s: %s \n" % (name, value))
+    document.add_page_break()
+    document.add_heading("Results description\n", 1)
+    quantities = list(dict.fromkeys(r[0] for r in rows))
+    for q in quantities:
+        document.add_heading(q, 2)
+        table = [[r[1], '%.6g' % r[2], r[3], r[4], r[5], '%.6g' % r[7], r[8], r[9], r[10]]
+                 for r in rows if r[0] == q]
+        docx_table.add_table(document, HEADER, table)
+    document.save(output)
+
+
+def main():
+    print('\n Headless Results Report')
+    print(' -----------------------\n')
+    parser = argparse.ArgumentParser(description='results report from a .h5 or .t16 file')
+    parser.add_argument('file')
+    parser.add_argument('-q', dest='quantities', default='')
+    parser.add_argument('-i', dest='increments', default='')
+    parser.add_argument('-o', dest='output', default=None)
+    args = parser.parse_args()
+    if not install_module_docx.require_docx():
+        sys.exit(1)
+    quantities = [q.strip() for q in args.quantities.split(',') if q.strip()]
+    job, ext = os.path.splitext(args.file)
+    output = args.output or "report_" + os.path.basename(job) + "_results.docx"
+    print(' Post file being used: ', args.file)
+    if ext.lower() == '.h5':
+        info, rows = h5_results(args.file, quantities, args.increments)
+    else:
+        info, rows = t16_results(args.file, quantities)
+    write_report(args.file, info, rows, output)
+    print(' Report written: ', output)
+    print('\n Headless Results Report End')
+    print(' ---------------------------\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,209 +1,156 @@
 from py_mentat import *
 
+import hashlib
 import os
 import sys 
 
 import subprocess
     
 import install_module_docx
+import mentat_query
+from mentat_query import INT, FLOAT, STRING, DATA
+# python-docx is imported when the report is saved (see report_document.py)
+from report_document import Document, lazy
+import docx_table
+import set_summary
+import element_census
 
-install_module_docx.installa_modulo()
+# appendices of the model report, off by default: they read an attribute
+# of every element (every entry of every set) of the model
+APPENDIX_ELEMENTS = False
+APPENDIX_SETS = False
 
 
-from docx import Document
-from docx.shared import Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT
+def image_digest(path):
+    # md5 of an image, None when it was not saved
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as filei:
+        return hashlib.md5(filei.read()).hexdigest()
 
 
 def main():
-    document = Document()
+    # python-docx is checked (and installed) before the queries, it is
+    # imported when the report is saved
+    if not install_module_docx.require_docx():
+        return
 
-    modelname0 = py_get_string("filename()")
+    modelname0 = mentat_query.get(STRING, "filename()")
     modelname1 = modelname0.replace(".mud","").replace(".mfd","")
-    titolo = "Report Model\n" + modelname1
-    titolo = titolo
-    d = document.add_heading(titolo , 0)
-    d.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    p = document.add_paragraph('')
-    p.add_run("\n")
-    modelname = py_get_string('model_name()')
-    p.add_run(f" Model name: {modelname} \n")
+    filename = "report_" + str(modelname1) + ".docx"
+    # only the sections whose data changed since the previous report are
+    # built again (see report_document.py)
+    document = Document(previous=filename)
+
+    modelname = mentat_query.get(STRING, 'model_name()')
+    if document.section("Title", modelname1, modelname):
+        titolo = "Report Model\n" + modelname1
+        titolo = titolo
+        d = document.add_heading(titolo , 0)
+        d.alignment = lazy('docx.enum.text', 'WD_ALIGN_PARAGRAPH.CENTER')
+        
+        p = document.add_paragraph('')
+        p.add_run("\n")
+        p.add_run(f" Model name: {modelname} \n")
 
+    # the picture is saved every time, the section is built again only
+    # when the image changed
     py_send("*fill_view")
     py_send('*image_save_current "model.png" yes')
-    
-    if os.path.exists("model.png"):
-        document.add_picture('model.png' , width=Inches(6.0) )
+    picture = image_digest("model.png")
+    if document.section("Model picture", picture):
+        if picture:
+            document.add_picture('model.png' , width=lazy('docx.shared', 'Inches', 6.0) )
     
     #Numero elementi
-    document.add_heading("Model description\n" , 1)
-    p = document.add_paragraph('')
-    nodi = py_get_int("nnodes()")
-    str1 = " Number of Nodes       %g \n" % (nodi)
-    p.add_run(str1)
-    elementi = py_get_int("nelements()")
-    str1 = " Number of Elements %g \n" % (elementi)
-    p.add_run(str1)
-      
-    document.add_page_break()
-
-    document.add_heading("Materials\n" , 1)
-    p = document.add_paragraph('')
-    m = py_get_int("nmaters()")
-    p.add_run(f"Number of Materials {m} \n\n") 
-    
-    table = document.add_table(rows=1, cols=5, style='Table Grid')
-    #table.style = 'TableGrid'
-    #table.style = 'ColorfulShading'
-    
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = 'Material Name'
-    hdr_cells[1].text = 'Type'
-    hdr_cells[2].text = 'Young'
-    hdr_cells[3].text = 'Poisson'
-    hdr_cells[4].text = 'Yield'
-    
-    
-    
-    for i in range(1,m+1):
+    nodi, elementi = mentat_query.bulk([(INT, "nnodes()"), (INT, "nelements()")])
+    if document.section("Model description", nodi, elementi):
+        document.add_heading("Model description\n" , 1)
+        p = document.add_paragraph('')
+        str1 = " Number of Nodes       %g \n" % (nodi)
+        p.add_run(str1)
+        str1 = " Number of Elements %g \n" % (elementi)
+        p.add_run(str1)
         
-        sn = py_get_string("mater_name_index(%d)" % i)
-        #p.add_run(f"  Material name   : {sn} \n")
-        st = py_get_string("mater_type(%s)" % sn)
-        #p.add_run(f"     Type              : {st} \n" )
-        e = py_get_float("mater_par(%s,structural:youngs_modulus)" % sn)
-        #p.add_run(f"     Youngs Modulus    : {e} \n")
-        p1 = py_get_float("mater_par(%s,structural:poissons_ratio)" % sn)
-        #p.add_run(f"      Poissons Ratio    : {p1} \n") 
-        ys = py_get_float("mater_par(%s,structural:yield_stress)" % sn)
-        #p.add_run(f"     Yield Stress      : {ys} \n")
+        document.add_page_break()
+
+    # all the material data in one batch (see mentat_query.py)
+    rows = mentat_query.table("nmaters()", "mater_name_index(%d)",
+                              [(STRING, "mater_type(%s)"),
+                               (FLOAT, "mater_par(%s,structural:youngs_modulus)"),
+                               (FLOAT, "mater_par(%s,structural:poissons_ratio)"),
+                               (FLOAT, "mater_par(%s,structural:yield_stress)")])
+    if document.section("Materials", rows):
+        document.add_heading("Materials\n" , 1)
+        p = document.add_paragraph('')
+        m = len(rows)
+        p.add_run(f"Number of Materials {m} \n\n") 
         
-        row_cells = table.add_row().cells
-        #row_cells[0].style = "borderColor:red;background-color:gray"
-        row_cells[0].text = str(sn)
-        row_cells[1].text = str(st)
-        row_cells[2].text = str(e)
-        #p=row_cells[2].add_paragraph( str(e) )
-        #p.alignment=WD_ALIGN_PARAGRAPH.RIGHT
-        #row_cells[2].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        row_cells[3].text = str(p1)
-        #table.cell(3,i).alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        row_cells[4].text = str(ys)
-        #table.cell(4,i).alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    
-    
-    document.add_page_break()
-
-    document.add_heading("Boundary Conditions\n" , 1)
-    p = document.add_paragraph('')
-    m = py_get_int("napplys()")
-    p.add_run(f"Number of Boundary Conditions {m} \n\n")
-    
-    table = document.add_table(rows=1, cols=3, style='Table Grid')
-    #table.style = 'TableGrid'
-    #table.style = 'ColorfulShading'
-    
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = 'Boundary Condition'
-    hdr_cells[1].text = 'Type'
-    hdr_cells[2].text = 'Value'
-    
-    for i in range(1,m+1):
-        sn = py_get_string("apply_name_index(%d)" % i)
-        st = py_get_string("apply_type(%s)" % sn)
-        so = py_get_string("apply_opt(%s,dof_values)" % sn)
-        #str1 = "  Boundary Cond %14s  Type %19s   Values by: %s\n" % (sn,st,so)
-        #p.add_run(str1)
+        # the whole table in one pass (see docx_table.py)
+        docx_table.add_table(document, ['Material Name', 'Type', 'Young', 'Poisson', 'Yield'], rows)
         
-        row_cells = table.add_row().cells
-        #row_cells[0].style = "borderColor:red;background-color:gray"
-        row_cells[0].text = str(sn)
-        row_cells[1].text = str(st)
-        row_cells[2].text = str(so)
+        document.add_page_break()
 
+    rows = mentat_query.table("napplys()", "apply_name_index(%d)",
+                              [(STRING, "apply_type(%s)"),
+                               (STRING, "apply_opt(%s,dof_values)")])
+    if document.section("Boundary Conditions", rows):
+        document.add_heading("Boundary Conditions\n" , 1)
+        p = document.add_paragraph('')
+        m = len(rows)
+        p.add_run(f"Number of Boundary Conditions {m} \n\n")
+        
+        docx_table.add_table(document, ['Boundary Condition', 'Type', 'Value'], rows)
 
-    document.add_page_break()
+        document.add_page_break()
         
-    document.add_heading("Contact\n" , 1)
-    p = document.add_paragraph('')
-    #print(" ")
-    m = py_get_int("ncbodys()")
+    rows = mentat_query.table("ncbodys()", "cbody_name_index(%d)", [(INT, "cbody_id(%s)")])
+    m = len(rows)
     if m != 0:
-        p.add_run(f"Number of Contact Bodys {m} \n\n")        
-            
-        table = document.add_table(rows=1, cols=2, style='Table Grid')
-        #table.style = 'TableGrid'
-        #table.style = 'ColorfulShading'
-        
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'Contact Body Name'
-        hdr_cells[1].text = 'ID'
-            
-        for i in range(1,m+1):
-            sn = py_get_string("cbody_name_index(%d)" % i)
-            id1 = py_get_int("cbody_id(%s)" % sn)
-              
-            row_cells = table.add_row().cells
-            row_cells[0].text = str(sn)
-            row_cells[1].text = str(id1)
-          
-          
-        print("")
-        p = document.add_paragraph('')
-        sn = py_get_string("ctable_name()")
-        p.add_run("\n\n  Contact Table     : " + str( sn) )
-        sn = "contact_table:the_mesh:refined_mesh:dist_tol"
-        dt = py_get_data(sn)
-        p.add_run("  Contact Dist Tol  : " +str( dt) )
-          
-          
-          
+        ctable, dt = mentat_query.bulk([(STRING, "ctable_name()"),
+                                        (DATA, "contact_table:the_mesh:refined_mesh:dist_tol")])
     else:
-        p.add_run(f" No contact bodies \n")
-
-    m = py_get_int("ngeoms()")
-    print("\n Geometric Properties ",m)
-    for i in range(1,m+1):
-      sn = py_get_string("geom_name_index(%d)" % i)
-      st = py_get_string("geom_type(%s)" % sn)
-      p  = py_get_float("geom_par(%s,thick)" % sn)
+        ctable, dt = None, None
+    if document.section("Contact", rows, ctable, dt):
+        document.add_heading("Contact\n" , 1)
+        p = document.add_paragraph('')
+        #print(" ")
+        if m != 0:
+            p.add_run(f"Number of Contact Bodys {m} \n\n")        
+                
+            docx_table.add_table(document, ['Contact Body Name', 'ID'], rows)
+              
+            print("")
+            p = document.add_paragraph('')
+            p.add_run("\n\n  Contact Table     : " + str( ctable) )
+            p.add_run("  Contact Dist Tol  : " +str( dt) )
+              
+        else:
+            p.add_run(f" No contact bodies \n")
+
+    rows = mentat_query.table("ngeoms()", "geom_name_index(%d)",
+                              [(STRING, "geom_type(%s)"), (FLOAT, "geom_par(%s,thick)")])
+    print("\n Geometric Properties ",len(rows))
+    for sn, st, p in rows:
       str1 = "  Geometric Prop  %12s  Type %19s   Thick %g" % (sn,st,p)
       print(str1)
 
-    m = py_get_int("niconds()")
-    print("\n Initial Conditions ",m)
-    for i in range(1,m+1):
-      sn = py_get_string("icond_name_index(%d)" % i)
-      st = py_get_string("icond_type(%s)" % sn)
-      so = py_get_string("icond_opt(%s,dof_values)" % sn)
+    rows = mentat_query.table("niconds()", "icond_name_index(%d)",
+                              [(STRING, "icond_type(%s)"), (STRING, "icond_opt(%s,dof_values)")])
+    print("\n Initial Conditions ",len(rows))
+    for sn, st, so in rows:
       str1 = "  Initial  Cond %14s  Type %12s   Values by: %s" % (sn,st,so)
       print(str1)
       
-    m = py_get_int("nsets()")
-    print("Found ",m," sets")
-    for i in range(1,m+1):
-      id = py_get_int("set_id(%d)" % i)
-      sn = py_get_string("set_name(%d)" % id)
-      stype = py_get_string("set_type(%d)" % id)
-      n = py_get_int("nset_entries(%d)" % id)
-
-      if stype not in ("icond","apply","lcase"):
+    # names, types and sizes of the sets in one batch; their contents
+    # are in the appendix
+    rows = mentat_query.table("nsets()", "set_id(%d)",
+                              [(STRING, "set_name(%s)"), (STRING, "set_type(%s)"),
+                               (INT, "nset_entries(%s)")], key_kind=INT)
+    print("Found ",len(rows)," sets")
+    for id, sn, stype, n in rows:
+      if stype not in set_summary.SKIP_TYPES:
        print("Set ",sn,"is a ",stype," set with ",n," entries")
-       """
-       for j in range(1,n+1):
-        k = py_get_int("set_entry(%d,%d)" % (id, j))
-        print("    entry ",j," is ",k, end=' ')
-        if (stype == 'face'):
-          l = py_get_int("set_edge(%d,%d)" % (id, j))
-          print("  face number ",l)
-        elif( stype == 'edge'):
-          l = py_get_int("set_edge(%d,%d)" % (id, j))
-          print("  edge number ",l)
-        else:
-          print(" ")
-        """
 
     print("")
     
@@ -211,54 +158,32 @@ def main():
 
 
     print("")
-    sn = py_get_string("geom_name()")
+    # current geometry, first loadcase and first job in one batch, then
+    # their types
+    sn, thick, lcase, job = mentat_query.bulk([(STRING, "geom_name()"), (DATA, "geometry:thick"),
+                                               (STRING, "lcase_name_index(1)"),
+                                               (STRING, "job_name_index(1)")])
     print("  Current geometry  : ", sn)
-    thick = py_get_data("geometry:thick")
     print("  Thickness         : ", thick)
 
-    """
-    print("")
-    m = py_get_int("nelements()")
-    max_eid = py_get_int("max_element_id()")
-    print(" Elements ", m, "   Maximum id ", max_eid)
-    for i in range(1,m+1):
-        id = py_get_int("element_id(%d)" % i)
-        print("")
-        sn = "element_class(%d)" % id
-        e_cl = py_get_int(sn)
-        sn = "element_family(%d)" % id
-        e_fam = py_get_int(sn)
-        sn = "element_type(%d)" % id
-        e_ty = py_get_int(sn)
-        print("  Element ", id, " Class ",e_cl," Family ",e_fam,", Type ",e_ty)
-        cbn = py_get_string("element_cbody(%d)" % id)
-        gmn = py_get_string("element_geom(%d)" % id)
-        orn = py_get_string("element_orient(%d)" % id)
-        mtn = py_get_string("element_mater(%d)" % id)
-        print("    Contact Body      : ", cbn)
-        print("    Geometry Property : ", gmn)
-        print("    Orientation       : ", orn)
-        print("    Material Property : ", mtn)
-    """
     
     
     
     
-    document.add_heading("Load Conditions\n" , 1)
-    p = document.add_paragraph('')
-    print("")
-    sn = py_get_string("lcase_name_index(1)")
-    st = py_get_string("lcase_type(%s)" % sn)
-    p.add_run(f" Loadcase             : ,{sn}, , Type ,{st}\n")
-    #st = py_get_string("lcase_opt(%s,arclength_meth)" % sn)
-    #print("   ArcLength Method   : ",st)
-    
-    document.add_heading("JOB \n" , 1)
-    p = document.add_paragraph('')
-    p.add_run("\n")
-    sn = py_get_string("job_name_index(1)")
-    st = py_get_string("job_class(%s)" % sn)
-    p.add_run(f" Job                  : {sn}, , Type ,{st} \n")
+    lcase_type, job_class = mentat_query.bulk([(STRING, "lcase_type(%s)" % lcase),
+                                               (STRING, "job_class(%s)" % job)])
+    if document.section("Load Conditions", lcase, lcase_type, job, job_class):
+        document.add_heading("Load Conditions\n" , 1)
+        p = document.add_paragraph('')
+        print("")
+        p.add_run(f" Loadcase             : ,{lcase}, , Type ,{lcase_type}\n")
+        #st = py_get_string("lcase_opt(%s,arclength_meth)" % sn)
+        #print("   ArcLength Method   : ",st)
+        
+        document.add_heading("JOB \n" , 1)
+        p = document.add_paragraph('')
+        p.add_run("\n")
+        p.add_run(f" Job                  : {job}, , Type ,{job_class} \n")
 
     
     #st = py_get_string("job_opt(%s,follow)" % sn)
@@ -308,9 +233,37 @@ def main():
     
     """
     
-    filename = "report_" + str(modelname1) + ".docx"
+    # appendix: element attributes in one batch, counted with numpy (see
+    # element_census.py)
+    census = []
+    if APPENDIX_ELEMENTS:
+        columns = element_census.read_elements(('type', 'mater', 'geom'))
+        census = element_census.census(columns, ('type', 'mater', 'geom'))
+    if census and document.section("Elements", census):
+        document.add_page_break()
+        document.add_heading("Appendix: Element Distribution\n" , 1)
+        p = document.add_paragraph('')
+        p.add_run(f"Number of Elements {sum(r[-1] for r in census)} \n\n")
+        docx_table.add_table(document, element_census.header(('type', 'mater', 'geom')), census)
+
+    # appendix: contents of the sets in bulk, ids as ranges (see
+    # set_summary.py)
+    types, rows = [], []
+    if APPENDIX_SETS:
+        types, rows = set_summary.summary(set_summary.read_sets())
+    if rows and document.section("Sets", types, rows):
+        document.add_page_break()
+        document.add_heading("Appendix: Sets\n" , 1)
+        p = document.add_paragraph('')
+        p.add_run(f"Number of Sets {len(rows)} \n\n")
+        docx_table.add_table(document, ['Set Type', 'Sets', 'Entries'], types)
+        p = document.add_paragraph('')
+        p.add_run("\n")
+        docx_table.add_table(document, ['Set Name', 'Type', 'Entries', 'Ids', 'Ranges', 'Ids (ranges)'], rows)
+
 
-    document.save(filename)
+    if not document.save(filename):
+        print("No change since the previous report: ", filename)
 
     try:
         #py_send("*system_command %s" % filename)
@@ -322,6 +275,6 @@ def main():
     py_prompt("Done")
 
 if __name__ == '__main__':
-    py_connect('',40007)
+    mentat_query.connect('',40007)
     main()
-    py_disconnect()
\ No newline at end of file
+    mentat_query.disconnect()
\ No newline at end of file
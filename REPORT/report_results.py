@@ -6,50 +6,54 @@ import sys
 import subprocess
 
 import install_module_docx
-install_module_docx.installa_modulo()
-
-
-from docx import Document
-from docx.shared import Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT
+import mentat_query
+import render_images
+from mentat_query import INT, STRING
+# python-docx is imported when the report is saved (see report_document.py)
+from report_document import Document, lazy
 
 
 def main():
 
     
     
+    # python-docx is checked (and installed) before the queries, it is
+    # imported when the report is saved
+    if not install_module_docx.require_docx():
+        return
     document = Document()
 
     
-    modelname0 = py_get_string("filename()")
+    modelname0 = mentat_query.get(STRING, "filename()")
     modelname1 = modelname0.replace(".t16","").replace(".t19","")
     
     titolo = "Report Model\n" + modelname1
     titolo = titolo
     d = document.add_heading(titolo , 0)
-    d.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    d.alignment = lazy('docx.enum.text', 'WD_ALIGN_PARAGRAPH.CENTER')
     
     p = document.add_paragraph('')
     p.add_run("\n")
-    modelname = py_get_string('model_name()')
+    modelname = mentat_query.get(STRING, 'model_name()')
     p.add_run(f" Model name: {modelname} \n")
 
-    py_send("*fill_view")
-    py_send("*post_rewind")
-    py_send("*post_off")
-    py_send('*image_save_current "results.png" yes')
-    
-    if os.path.exists("model.png"):
-        document.add_picture('model.png' , width=Inches(6.0) )
+    lista_res = ["Displacement"]    # , "Total Equivalent Plastic Strain","Equivalent Von Mises Stress"]
+    print(lista_res)
+
+    # the model (post off) and the last increment of every result, only
+    # the images not in the cache are rendered (see render_images.py)
+    jobs = [(None, 0, 'default')] + render_images.image_jobs(lista_res)
+    images = render_images.render(modelname0, jobs)
+
+    if jobs[0] in images:
+        document.add_picture(images[jobs[0]] , width=lazy('docx.shared', 'Inches', 6.0) )
     
     #Numero elementi
     document.add_heading("Model description\n" , 1)
     p1 = document.add_paragraph('')
-    nodi = py_get_int("nnodes()")
+    nodi, elementi = mentat_query.bulk([(INT, "nnodes()"), (INT, "nelements()")])
     str1 = " Number of Nodes       %g \n" % (nodi)
     p1.add_run(str1)
-    elementi = py_get_int("nelements()")
     str1 = " Number of Elements %g \n" % (elementi)
     p1.add_run(str1)
     
@@ -64,22 +68,11 @@ def main():
     #p1.add_run(stri)
     
     
-    lista_res = ["Displacement"]    # , "Total Equivalent Plastic Strain","Equivalent Von Mises Stress"]
-    
-    py_send("*post_skip_to_last")
-    py_send("*system_grid_display_off")
-    
-    py_send("*post_contour_bands")
-
-    print(lista_res)
-    
-    for val1 in lista_res:
-        py_send("*post_value %s" % val1 )
-        py_send('*image_save_current "%s.png" yes' % val1)
-        if os.path.exists("%s.png" % val1 ):
+    for job in jobs[1:]:
+        if job in images:
             p1 = document.add_paragraph('')
-            p1.add_run("Displacement\n")
-            document.add_picture('Displacement.png' , width=Inches(6.0) )
+            p1.add_run("%s\n" % job[0])
+            document.add_picture(images[job] , width=lazy('docx.shared', 'Inches', 6.0) )
             document.add_page_break()
     
     filename = "report_" + str(modelname1) + "_results.docx"
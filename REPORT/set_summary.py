@@ -0,0 +1,93 @@
+# ---------------------------------------------------------------------
+# description
+# summary of the sets of a Mentat model for the model report: the
+# entries of every set are read in bulk, the ids are compressed into
+# ranges (1-100, 205, 300-310) and the sets are counted by entity type
+#
+# usage
+#   import set_summary
+#   sets = set_summary.read_sets()           # [(name, type, ids, edges)]
+#   types, rows = set_summary.summary(sets)
+#   # types = [[type, # sets, # entries]]
+#   # rows  = [[name, type, # entries, # ids, # ranges, ranges text]]
+#
+# Notes:
+# the entries of a set are one series query (see mentat_query.py), so
+# a set of 10^6 entries costs one batch, not 10^6 round trips.
+# face and edge sets hold (element, face/edge number) entries: the ids
+# are the elements, and the text ends with the count of entries of each
+# face/edge number.
+# the ranges are found with numpy (sort, unique, breaks where the next
+# id is not id + 1); the text of a set shows the first MAX_RANGES
+# ranges and the number of the others.
+# ---------------------------------------------------------------------
+import numpy as np
+
+import mentat_query
+from mentat_query import INT, STRING
+
+# sets of the loads, initial conditions and loadcases, not listed
+SKIP_TYPES = ("icond", "apply", "lcase")
+# set types with an edge/face number per entry
+EDGE_TYPES = ("face", "edge")
+# largest number of ranges written for a set
+MAX_RANGES = 50
+
+
+def read_sets():
+    # (name, type, ids, edge/face numbers or None) of the model sets
+    rows = mentat_query.table("nsets()", "set_id(%d)",
+                              [(STRING, "set_name(%s)"), (STRING, "set_type(%s)"),
+                               (INT, "nset_entries(%s)")], key_kind=INT)
+    rows = [r for r in rows if r[2] not in SKIP_TYPES]
+    # all the entries of all the sets in one batch
+    queries = [(INT, "set_entry(%d,%%d)" % sid, n) for sid, name, stype, n in rows if n > 0]
+    queries += [(INT, "set_edge(%d,%%d)" % sid, n) for sid, name, stype, n in rows
+                if n > 0 and stype in EDGE_TYPES]
+    values = iter(mentat_query.bulk(queries))
+    ids = [np.array(next(values), dtype='i8') if n > 0 else np.zeros(0, dtype='i8')
+           for sid, name, stype, n in rows]
+    sets = []
+    for (sid, name, stype, n), entries in zip(rows, ids):
+        edges = None
+        if n > 0 and stype in EDGE_TYPES:
+            edges = np.array(next(values), dtype='i8')
+        sets.append((name, stype, entries, edges))
+    return sets
+
+
+def compress(ids):
+    # (first, last) of the runs of consecutive ids, shape (nrange, 2)
+    ids = np.unique(np.asarray(ids, dtype='i8'))
+    if ids.size == 0:
+        return np.zeros((0, 2), dtype='i8')
+    breaks = np.flatnonzero(np.diff(ids) != 1)
+    first = np.concatenate([ids[0:1], ids[breaks + 1]])
+    last = np.concatenate([ids[breaks], ids[-1:]])
+    return np.column_stack([first, last])
+
+
+def ranges_text(ranges, max_ranges=MAX_RANGES):
+    # "1-100, 205, 300-310" for the first max_ranges ranges
+    text = ', '.join('%d' % a if a == b else '%d-%d' % (a, b) for a, b in ranges[0:max_ranges])
+    if len(ranges) > max_ranges:
+        text += ', ... (%d more ranges)' % (len(ranges) - max_ranges)
+    return text
+
+
+def summary(sets):
+    # counts by entity type and one row per set
+    rows = []
+    types = {}
+    for name, stype, ids, edges in sets:
+        ranges = compress(ids)
+        text = ranges_text(ranges)
+        if edges is not None and edges.size:
+            numbers, counts = np.unique(edges, return_counts=True)
+            text += '\n%s: ' % stype + ', '.join('%d (%d)' % (k, c) for k, c in zip(numbers, counts))
+        nids = int((ranges[:, 1] - ranges[:, 0] + 1).sum())
+        rows.append([name, stype, len(ids), nids, len(ranges), text])
+        t = types.setdefault(stype, [stype, 0, 0])
+        t[1] += 1
+        t[2] += len(ids)
+    return sorted(types.values()), rows
@@ -0,0 +1,153 @@
+# ---------------------------------------------------------------------
+# description
+# benchmark of the two h5 backends used in this folder, h5py
+# (h5py_marc.py) and PyTables (tables_displacement_resultant4.py), on
+# synthetic Marc result files of several sizes (see synthetic_h5.py)
+#
+# measured for each backend and model size:
+#   open      : open the file read-only
+#   walk      : visit all groups/datasets and read their attributes
+#   full read : read the whole Displacement dataset
+#   inc read  : read one increment of Displacement (median)
+#   write     : compute the resultant per increment and write it as a
+#               new chunked, compressed dataset
+#
+# usage
+# open CMD shell in this folder and then type:
+#   python benchmark_backends.py
+# optional arguments are the number of increments and the model sizes
+# in nodes (default 20 and 10000 100000 500000):
+#   python benchmark_backends.py 50 100000 1000000
+#
+# Notes:
+# runs offline: the files are generated in a temporary folder and
+# deleted at the end. times are in seconds except inc read (ms).
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+import os
+import sys
+import tempfile
+import time
+
+import marc_h5
+import synthetic_h5
+
+try:
+    import tables as tb
+except ImportError:
+    tb = None
+
+DISP = marc_h5.NODE + '/Displacement'
+
+
+def bench_h5py(filename):
+    res = {}
+    t0 = time.perf_counter()
+    hdf = h5py.File(filename, 'r')
+    res['open'] = time.perf_counter() - t0
+    with hdf:
+        t0 = time.perf_counter()
+        keys = []
+        hdf.visit(lambda key: keys.append(key))
+        for name in keys:
+            attrs = hdf[name].attrs
+            for k in attrs.keys():
+                attrs[k]
+        res['walk'] = time.perf_counter() - t0
+        disp = hdf[DISP]
+        t0 = time.perf_counter()
+        disp[()]
+        res['full read'] = time.perf_counter() - t0
+        nnode, ninc = disp.shape[0], disp.shape[2]
+        buf = np.empty(marc_h5.node_result_shape(nnode, 3, 1), dtype=disp.dtype)
+        lat = []
+        for i in range(ninc):
+            t0 = time.perf_counter()
+            disp.read_direct(buf, marc_h5.node_sel(i))
+            lat.append(time.perf_counter() - t0)
+        res['inc read'] = np.median(lat) * 1000.0
+    t0 = time.perf_counter()
+    with h5py.File(filename, 'a') as hdf:
+        disp = hdf[DISP]
+        nnode, ninc = disp.shape[0], disp.shape[2]
+        shape = marc_h5.node_result_shape(nnode, 1, ninc)
+        out = hdf.create_dataset(marc_h5.NODE + '/Bench', shape=shape, dtype=disp.dtype,
+                                 **marc_h5.result_storage(shape, disp.dtype))
+        xy = np.empty(marc_h5.node_result_shape(nnode, 2, 1), dtype=disp.dtype)
+        mag = np.empty(marc_h5.node_result_shape(nnode, 1, 1), dtype=disp.dtype)
+        for i in range(ninc):
+            disp.read_direct(xy, marc_h5.node_sel(i, comp=slice(0, 2)))
+            np.hypot(xy[:, 0], xy[:, 1], out=mag[:, 0])
+            out.write_direct(mag, dest_sel=marc_h5.node_sel(i))
+        del hdf[marc_h5.NODE + '/Bench']
+    res['write'] = time.perf_counter() - t0
+    return res
+
+
+def bench_tables(filename):
+    res = {}
+    t0 = time.perf_counter()
+    hdf = tb.open_file(filename, 'r')
+    res['open'] = time.perf_counter() - t0
+    with hdf:
+        t0 = time.perf_counter()
+        for node in hdf.walk_nodes():
+            for k in node._v_attrs._f_list():
+                getattr(node._v_attrs, k)
+        res['walk'] = time.perf_counter() - t0
+        disp = hdf.get_node('/' + DISP)
+        t0 = time.perf_counter()
+        disp.read()
+        res['full read'] = time.perf_counter() - t0
+        ninc = disp.shape[2]
+        lat = []
+        for i in range(ninc):
+            t0 = time.perf_counter()
+            disp[:, :, i:i + 1, 0:1, 0:1, 0:1, 0:1]
+            lat.append(time.perf_counter() - t0)
+        res['inc read'] = np.median(lat) * 1000.0
+    t0 = time.perf_counter()
+    with tb.open_file(filename, 'a') as hdf:
+        disp = hdf.get_node('/' + DISP)
+        nnode, ninc = disp.shape[0], disp.shape[2]
+        chunks = marc_h5.result_storage(marc_h5.node_result_shape(nnode, 1, ninc), disp.dtype)['chunks']
+        out = hdf.create_carray('/' + marc_h5.NODE, 'Bench', atom=tb.Atom.from_dtype(disp.dtype),
+                                shape=marc_h5.node_result_shape(nnode, 1, ninc), chunkshape=chunks,
+                                filters=tb.Filters(complevel=marc_h5.COMPRESSION_OPTS, complib='zlib',
+                                                   shuffle=marc_h5.SHUFFLE))
+        mag = np.empty(nnode, dtype=disp.dtype)
+        for i in range(ninc):
+            xy = disp[:, 0:2, i, 0, 0, 0, 0]
+            np.hypot(xy[:, 0], xy[:, 1], out=mag)
+            out[:, 0, i, 0, 0, 0, 0] = mag
+        hdf.remove_node('/' + marc_h5.NODE, 'Bench')
+    res['write'] = time.perf_counter() - t0
+    return res
+
+
+def main():
+    ninc = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    sizes = [int(v) for v in sys.argv[2:]] or [10000, 100000, 500000]
+    backends = [('h5py', bench_h5py)]
+    if tb is not None:
+        backends.append(('PyTables', bench_tables))
+    else:
+        print(' PyTables not installed: only h5py is measured')
+    columns = ['open', 'walk', 'full read', 'inc read', 'write']
+    print('\n HDF5 Backend Benchmark')
+    print(' ----------------------\n')
+    print(' %10s %-9s' % ('# Nodes', 'Backend') + ''.join(' %11s' % c for c in columns))
+    with tempfile.TemporaryDirectory() as folder:
+        for nnode in sizes:
+            filename = os.path.join(folder, 'synthetic_%d.h5' % nnode)
+            nnode, nelem = synthetic_h5.generate(filename, nnode, ninc)
+            for name, bench in backends:
+                res = bench(filename)
+                print(' %10d %-9s' % (nnode, name) + ''.join(' %11.4f' % res[c] for c in columns))
+            os.remove(filename)
+    print('')
+
+
+if __name__ == '__main__':
+    main()
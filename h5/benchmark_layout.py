@@ -0,0 +1,99 @@
+# ---------------------------------------------------------------------
+# description
+# benchmark of the storage layouts available for user results
+# (see marc_h5.result_storage): a synthetic nodal result is written
+# with each layout and then read back one increment at a time, which
+# is how Mentat's post-processor reads results
+#
+# usage
+# open CMD shell in this folder and then type:
+#   python benchmark_layout.py
+# optional arguments are the number of nodes, components and
+# increments (default 200000 1 50):
+#   python benchmark_layout.py 1000000 3 100
+#
+# Notes:
+# the files are written in a temporary folder and deleted at the end.
+# the synthetic values are smooth in space and time like real results,
+# so the compression ratio is indicative only.
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+import os
+import sys
+import tempfile
+import time
+
+import marc_h5
+
+LAYOUTS = [
+    ('contiguous', 'contiguous', None),
+    ('increment', 'increment', None),
+    ('increment, no compression', 'increment', {'compression': None}),
+    ('node', 'node', None),
+]
+
+
+def increment_values(nnode, ncomp, i, dtype_float):
+    # smooth synthetic field for increment i
+    x = np.linspace(0.0, 1.0, nnode, dtype=dtype_float)
+    val = np.empty(marc_h5.node_result_shape(nnode, ncomp, 1), dtype=dtype_float)
+    for c in range(ncomp):
+        val[:, c, 0, 0, 0, 0, 0] = np.sin(6.0 * x + c) * (1.0 + 0.01 * i)
+    return val
+
+
+def run_layout(folder, name, layout, options, nnode, ncomp, ninc, dtype_float):
+    path = os.path.join(folder, name.replace(' ', '_').replace(',', '') + '.h5')
+    shape = marc_h5.node_result_shape(nnode, ncomp, ninc)
+    storage = marc_h5.result_storage(shape, dtype_float, layout)
+    if options:
+        for k, v in options.items():
+            if v is None:
+                storage.pop(k, None)
+                storage.pop(k + '_opts', None)
+            else:
+                storage[k] = v
+    # write one increment at a time
+    t0 = time.perf_counter()
+    with h5py.File(path, 'w') as hdf:
+        dset = hdf.create_dataset('Resultant', shape=shape, dtype=dtype_float, **storage)
+        for i in range(ninc):
+            dset.write_direct(increment_values(nnode, ncomp, i, dtype_float),
+                              dest_sel=marc_h5.node_sel(i))
+    t_write = time.perf_counter() - t0
+    size = os.path.getsize(path)
+    # read one increment at a time into a reusable buffer
+    buf = np.empty(marc_h5.node_result_shape(nnode, ncomp, 1), dtype=dtype_float)
+    lat = []
+    with h5py.File(path, 'r') as hdf:
+        dset = hdf['Resultant']
+        for i in range(ninc):
+            t0 = time.perf_counter()
+            dset.read_direct(buf, marc_h5.node_sel(i))
+            lat.append(time.perf_counter() - t0)
+    os.remove(path)
+    lat = np.array(lat) * 1000.0
+    return size, t_write, np.median(lat), lat.max()
+
+
+def main():
+    nnode = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    ncomp = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    ninc = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    dtype_float = 'float64'
+    print('\n User Result Storage Benchmark')
+    print(' -----------------------------\n')
+    print(' # Nodes: %d   # Components: %d   # Increments: %d\n' % (nnode, ncomp, ninc))
+    print(' %-28s %12s %10s %14s %14s' % ('Layout', 'Size [MB]', 'Write [s]',
+                                          'Read/inc [ms]', 'Max/inc [ms]'))
+    with tempfile.TemporaryDirectory() as folder:
+        for name, layout, options in LAYOUTS:
+            size, t_write, med, mx = run_layout(folder, name, layout, options,
+                                                nnode, ncomp, ninc, dtype_float)
+            print(' %-28s %12.2f %10.3f %14.3f %14.3f' % (name, size / 1.0e6, t_write, med, mx))
+    print('')
+
+
+if __name__ == '__main__':
+    main()
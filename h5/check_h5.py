@@ -0,0 +1,376 @@
+# ---------------------------------------------------------------------
+# description
+# integrity pre-check of a Marc h5 result file, to run before a long
+# post-processing run so that a batch does not fail halfway through
+#
+# checks:
+#   - status_flags of the superblock left set by a crashed writer (the
+#     file cannot be opened, see the h5clear note in h5py_marc.py)
+#   - file shorter than the end-of-file address of the superblock and
+#     datasets with chunks or data beyond the end of the file (the
+#     file was truncated, e.g. disk full or copy interrupted)
+#   - results with fewer increments than the Summary (job stopped)
+#   - post summaries not matching the user results of the group, e.g.
+#     a duplicate "-1" post code or a user result without its row
+#   - staging file left by a crashed run, and datasets of a publish
+#     that did not finish (see staging.py)
+#   - mesh ids of the Summary (remeshing) without node or element ids,
+#     neither in the id datasets nor in Analysis Data (see id_index.py)
+#
+# usage
+# open CMD shell in same folder as h5 file and then type:
+#   python check_h5.py job1.h5
+# and to repair what can be repaired (status_flags, post summaries):
+#   python check_h5.py job1.h5 --repair
+# from another script:
+#   import check_h5
+#   check_h5.precheck(file)     # raises OSError on errors
+#
+# Notes:
+# clearing the status_flags is what "h5clear -s" does. only use it when
+# no program is writing the file: the flags are also set while Marc
+# or Mentat have the file open for writing.
+# the chunk and data addresses are read from the file metadata, no
+# result data is read, so the check takes seconds on large files.
+# staging.open_staging runs precheck before every computation (repair
+# with open_staging(file, repair=True)); a failed precheck names the
+# --repair command.
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+import argparse
+import os
+import sys
+
+import id_index
+import marc_h5
+import mesh_stream
+
+SIGNATURE = b'\x89HDF\r\n\x1a\n'
+ERROR = 'error'
+WARNING = 'warning'
+
+
+# ---------------------------------------------------------------------
+# superblock
+#
+# version 0/1 : signature(8) versions(8) K values(4) flags(4 bytes)
+#               base, free-space, end-of-file, driver addresses ...
+#               (version 1 has 4 more bytes before the addresses)
+# version 2/3 : signature(8) version(1) size of offsets(1) size of
+#               lengths(1) flags(1 byte) base, extension, end-of-file,
+#               root group addresses, checksum(4)
+# the checksum of versions 2/3 is Bob Jenkins' lookup3 hash used by
+# the HDF5 library (H5_checksum_lookup3)
+# ---------------------------------------------------------------------
+def _rot(x, k):
+    return ((x << k) | (x >> (32 - k))) & 0xffffffff
+
+
+def _mix(a, b, c):
+    m = 0xffffffff
+    a = ((a - c) & m) ^ _rot(c, 4)
+    c = (c + b) & m
+    b = ((b - a) & m) ^ _rot(a, 6)
+    a = (a + c) & m
+    c = ((c - b) & m) ^ _rot(b, 8)
+    b = (b + a) & m
+    a = ((a - c) & m) ^ _rot(c, 16)
+    c = (c + b) & m
+    b = ((b - a) & m) ^ _rot(a, 19)
+    a = (a + c) & m
+    c = ((c - b) & m) ^ _rot(b, 4)
+    b = (b + a) & m
+    return a, b, c
+
+
+def _final(a, b, c):
+    m = 0xffffffff
+    c = ((c ^ b) - _rot(b, 14)) & m
+    a = ((a ^ c) - _rot(c, 11)) & m
+    b = ((b ^ a) - _rot(a, 25)) & m
+    c = ((c ^ b) - _rot(b, 16)) & m
+    a = ((a ^ c) - _rot(c, 4)) & m
+    b = ((b ^ a) - _rot(a, 14)) & m
+    c = ((c ^ b) - _rot(b, 24)) & m
+    return c
+
+
+def lookup3(data, initval=0):
+    # lookup3 hashlittle checksum of a byte string
+    m = 0xffffffff
+    length = len(data)
+    a = b = c = (0xdeadbeef + length + initval) & m
+    # the last block of 1-12 bytes is padded with zeros
+    data = data + b'\x00' * (-length % 12)
+    for i in range(0, len(data), 12):
+        a = (a + int.from_bytes(data[i:i + 4], 'little')) & m
+        b = (b + int.from_bytes(data[i + 4:i + 8], 'little')) & m
+        c = (c + int.from_bytes(data[i + 8:i + 12], 'little')) & m
+        if i + 12 < len(data):
+            a, b, c = _mix(a, b, c)
+        else:
+            c = _final(a, b, c)
+    return c
+
+
+def read_superblock(filename):
+    # {'offset', 'version', 'flags', 'flags_pos', 'flags_size', 'eof',
+    #  'size', 'checksum_pos'} of the superblock, None if not found
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as fileo:
+        # the superblock is at 0, 512, 1024, 2048, ... bytes
+        offset = 0
+        while offset < size:
+            fileo.seek(offset)
+            head = fileo.read(64)
+            if head[0:8] == SIGNATURE:
+                break
+            offset = 512 if offset == 0 else 2 * offset
+        else:
+            return None
+    version = head[8]
+    sb = {'offset': offset, 'version': version, 'size': size}
+    if version >= 2:
+        nof = head[9]
+        sb['flags_pos'], sb['flags_size'] = 11, 1
+        # base, extension, end-of-file, root group addresses
+        p = 12 + 2 * nof
+        sb['checksum_pos'] = 12 + 4 * nof
+    else:
+        nof = head[13]
+        sb['flags_pos'], sb['flags_size'] = 20, 4
+        # base, free-space, end-of-file, driver addresses
+        p = (24 if version == 0 else 28) + 2 * nof
+        sb['checksum_pos'] = None
+    sb['flags'] = int.from_bytes(head[sb['flags_pos']:sb['flags_pos'] + sb['flags_size']], 'little')
+    base = int.from_bytes(head[p - 2 * nof:p - nof], 'little')
+    sb['eof'] = base + int.from_bytes(head[p:p + nof], 'little')
+    return sb
+
+
+def clear_status_flags(filename, sb):
+    # set the status_flags of the superblock to 0 (h5clear -s)
+    pos = sb['offset'] + sb['flags_pos']
+    with open(filename, 'r+b') as fileo:
+        fileo.seek(pos)
+        fileo.write(b'\x00' * sb['flags_size'])
+        if sb['checksum_pos'] is not None:
+            # new checksum of the superblock
+            fileo.seek(sb['offset'])
+            body = fileo.read(sb['checksum_pos'])
+            fileo.write(lookup3(body).to_bytes(4, 'little'))
+
+
+# ---------------------------------------------------------------------
+# datasets
+# ---------------------------------------------------------------------
+def dataset_end(dset):
+    # largest file address used by the raw data of a dataset, None when
+    # no data is allocated
+    dsid = dset.id
+    layout = dsid.get_create_plist().get_layout()
+    if layout == h5py.h5d.CONTIGUOUS:
+        offset = dsid.get_offset()
+        return None if offset is None else offset + dsid.get_storage_size()
+    if layout != h5py.h5d.CHUNKED:
+        return None
+    end = [None]
+
+    def visit(info):
+        if info.byte_offset is not None:
+            stop = info.byte_offset + info.size
+            if end[0] is None or stop > end[0]:
+                end[0] = stop
+    if hasattr(dsid, 'chunk_iter'):
+        dsid.chunk_iter(visit)
+    else:
+        for k in range(dsid.get_num_chunks()):
+            visit(dsid.get_chunk_info(k))
+    return end[0]
+
+
+def check_datasets(hdf, size, issues):
+    # datasets with raw data beyond the end of the file
+    names = []
+    hdf.visit(lambda name: names.append(name))
+    for name in names:
+        obj = hdf[name]
+        if not isinstance(obj, h5py.Dataset):
+            continue
+        try:
+            end = dataset_end(obj)
+        except (OSError, RuntimeError) as e:
+            issues.append((ERROR, 'unreadable dataset %s: %s' % (name, e), False))
+            continue
+        if end is not None and end > size:
+            issues.append((ERROR, 'truncated dataset %s: data up to byte %d, file size %d'
+                           % (name, end, size), False))
+
+
+def check_increments(hdf, issues):
+    # results with fewer increments than the Summary (end row excluded)
+    if marc_h5.SUMMARY not in hdf:
+        return
+    summary = hdf[marc_h5.SUMMARY]
+    inc = summary.fields(marc_h5.summary_field(summary.dtype, 'INC'))[()]
+    nsum = int((inc >= 0).sum())
+    for group in (marc_h5.NODE, marc_h5.ELEMENT):
+        if group not in hdf:
+            continue
+        name = marc_h5.post_summary_name(group)
+        for label, dset in hdf[group].items():
+            if label == name or not isinstance(dset, h5py.Dataset):
+                continue
+            ninc = dset.shape[3] if dset.ndim == marc_h5.ELEMENT_NDIM else dset.shape[2]
+            if ninc < nsum:
+                issues.append((WARNING, '%s/%s has %d increments, the Summary %d'
+                               % (group, label, ninc, nsum), False))
+
+
+def check_meshes(hdf, issues):
+    # mesh ids of the increments that have no ids in the id index: the
+    # tools then look their ids up in mesh 1
+    if marc_h5.SUMMARY not in hdf or marc_h5.NODE + '/Displacement' not in hdf:
+        return
+    meshes = np.unique(mesh_stream.increment_meshes(hdf, hdf[marc_h5.SUMMARY].shape[0]))
+    for kind in ('node', 'element'):
+        if kind == 'element' and marc_h5.CONNECTIVITY not in hdf:
+            continue
+        ncol = id_index.read_ids(hdf, kind).shape[1]
+        for m in meshes[meshes > ncol]:
+            issues.append((WARNING, 'mesh id %d has no %s ids, the ids of mesh 1 are used'
+                           % (m, kind), False))
+
+
+def post_summary_issues(hdf, group):
+    # messages for a post summary that does not match the user results
+    g = hdf[group]
+    name = marc_h5.post_summary_name(group)
+    if name not in g:
+        return []
+    summary = g[name][()]
+    codes = summary[:, 0, 0, 0, 0, 0, 0]
+    nrow = int((codes == marc_h5.USER_POSTCODE).sum())
+    users = [k for k in g if k != name and marc_h5.is_user_result(g[k])]
+    messages = []
+    if nrow != len(users):
+        messages.append('%s/%s has %d "-1" post code rows for %d user results'
+                        % (group, name, nrow, len(users)))
+    else:
+        # number of components of each user result (in group order)
+        ncomp = [g[k].shape[2] if g[k].ndim == marc_h5.ELEMENT_NDIM else g[k].shape[1] for k in users]
+        if list(summary[codes == marc_h5.USER_POSTCODE, 2, 0, 0, 0, 0, 0]) != ncomp:
+            messages.append('%s/%s: number of components of the "-1" rows does not match the '
+                            'user results' % (group, name))
+    solver = codes[codes != marc_h5.USER_POSTCODE]
+    if len(np.unique(solver)) != len(solver):
+        messages.append('%s/%s has duplicate post codes' % (group, name))
+    for k in users:
+        if 'user_post_label' not in g[k].attrs:
+            messages.append('%s/%s has no user_post_label attribute' % (group, k))
+    return messages
+
+
+# ---------------------------------------------------------------------
+# check and repair
+# ---------------------------------------------------------------------
+def check(filename, repair=False, staging=True):
+    # list of (severity, message, repaired) for a result file; the
+    # staging file is not checked when staging is False
+    issues = []
+    sb = read_superblock(filename)
+    if sb is None:
+        return [(ERROR, 'no HDF5 superblock, not an h5 file', False)]
+    # the status_flags are used by the file locking of superblock
+    # versions 2/3 only, older versions ignore them
+    if sb['version'] < 2:
+        sb['flags'] = 0
+    if sb['flags']:
+        # 0x01 write access, 0x04 SWMR write access
+        done = False
+        if repair:
+            clear_status_flags(filename, sb)
+            done = True
+        issues.append((ERROR, 'status_flags set (0x%x): file not closed by its writer'
+                       % sb['flags'], done))
+    if sb['eof'] is not None and sb['eof'] > sb['size']:
+        issues.append((ERROR, 'file truncated: end of file address %d, file size %d'
+                       % (sb['eof'], sb['size']), False))
+    if staging and os.path.exists(filename + '.staging.h5'):
+        issues.append((WARNING, 'staging file left by an earlier run, publish it with: '
+                       'python staging.py %s' % filename, False))
+    if sb['flags'] and not repair:
+        # the library refuses to open the file
+        return issues
+    try:
+        hdf = h5py.File(filename, 'r')
+    except OSError as e:
+        issues.append((ERROR, 'file cannot be opened: %s' % e, False))
+        return issues
+    post = []
+    with hdf:
+        check_datasets(hdf, sb['size'], issues)
+        check_increments(hdf, issues)
+        check_meshes(hdf, issues)
+        if '_publish' in hdf:
+            issues.append((WARNING, 'datasets of an unfinished publish, deleted by the next '
+                           'publish: python staging.py %s' % filename, False))
+        for group in (marc_h5.NODE, marc_h5.ELEMENT):
+            if group in hdf:
+                post += [(group, m) for m in post_summary_issues(hdf, group)]
+    # post summaries are rebuilt from the user results of the group
+    # : only a warning, the file can be read and staging.publish
+    #   rebuilds them too
+    groups = sorted(set(g for g, m in post))
+    if repair and groups:
+        with h5py.File(filename, 'a') as hdf:
+            dtype_int, dtype_float = marc_h5.file_dtypes(hdf)
+            for group in groups:
+                marc_h5.sync_post_summary(hdf, group, dtype_int)
+            left = [m for group in groups for m in post_summary_issues(hdf, group)]
+        issues += [(WARNING, m, m not in left) for g, m in post]
+    else:
+        issues += [(WARNING, m, False) for g, m in post]
+    return issues
+
+
+def precheck(filename, repair=False, staging=True):
+    # check a file before a long run: warnings are printed, errors that
+    # are not repaired raise OSError
+    issues = check(filename, repair, staging)
+    for severity, message, repaired in issues:
+        if severity == WARNING or repaired:
+            print('  %s: %s%s' % (severity, message, ' (repaired)' if repaired else ''))
+    errors = [m for severity, m, repaired in issues if severity == ERROR and not repaired]
+    if errors:
+        hint = '' if repair else '\n  run "python check_h5.py %s --repair" to repair it' % filename
+        raise OSError('%s failed the integrity check:\n  %s%s'
+                      % (filename, '\n  '.join(errors), hint))
+    return issues
+
+
+def main():
+    print('\n HDF5 Integrity Check')
+    print(' --------------------\n')
+    parser = argparse.ArgumentParser(description='integrity check of Marc h5 files')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--repair', action='store_true')
+    args = parser.parse_args()
+    status = 0
+    for file in args.files:
+        print(' HDF5 file being checked: ', file)
+        issues = check(file, args.repair)
+        for severity, message, repaired in issues:
+            print('  %-8s %s%s' % (severity, message, ' (repaired)' if repaired else ''))
+        if any(s == ERROR and not r for s, m, r in issues):
+            status = 1
+        elif not issues:
+            print('  ok')
+    print('\n HDF5 Integrity Check End')
+    print(' ------------------------\n')
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# ---------------------------------------------------------------------
+# description
+# script to compare the results of two Marc h5 files, e.g. the same job
+# run with two solver versions or two mesh densities
+#
+# for every quantity found in both files (nodal and element results),
+# increment by increment, it reports the largest absolute and relative
+# errors with the node (element) id and increment where they occur
+#
+# usage
+# open CMD shell in the folder with the h5 files and then type:
+#   python diff_results.py job1_old.h5 job1_new.h5
+#   python diff_results.py old.h5 new.h5 -q Displacement -t 1e-6 -w 4 -o diff.csv
+# options:
+#   -q  quantity names (comma separated, default: all common ones)
+#   -i  increments, as first:last or a comma separated list (default:
+#       all increments of both files)
+#   -r  relative error floor, as a fraction of the largest absolute
+#       value of the increment (default 1e-6)
+#   -t  absolute tolerance: the exit status is 1 when a larger error is
+#       found, for use in regression scripts
+#   -w  number of worker processes (default 1: no pool)
+#   -o  output table, .npz or .csv
+#
+# Notes:
+# the rows are matched by node (element) id with the id index of each
+# file (see id_index.py), so renumbered or remeshed models are compared
+# on the common ids; ids found only in the first file are counted as
+# missing.
+# only one increment of each file is in memory at a time (see
+# mesh_stream.py). with -w the increments are split in ranges over a
+# process pool, every worker opens both files read-only.
+# ---------------------------------------------------------------------
+import numpy as np
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import id_index
+import marc_file
+import marc_h5
+
+STATS = ('abs', 'abs_id', 'abs_inc', 'abs_comp', 'rel', 'rel_id', 'rel_inc', 'rel_comp',
+         'compared', 'missing')
+
+
+def common_quantities(mf_a, mf_b):
+    # (group, name) of the results in both files with the same number
+    # of components (and integration points)
+    common = []
+    for group in (marc_h5.NODE, marc_h5.ELEMENT):
+        names_b = set(mf_b.quantities(group))
+        for name in mf_a.quantities(group):
+            if name not in names_b:
+                continue
+            a = mf_a.hdf[group + '/' + name]
+            b = mf_b.hdf[group + '/' + name]
+            if a.ndim == b.ndim and a.shape[1:-5] == b.shape[1:-5]:
+                common.append((group, name))
+    return common
+
+
+def empty_stats():
+    stats = dict.fromkeys(STATS, 0)
+    stats['abs'] = stats['rel'] = -1.0
+    return stats
+
+
+def merge_stats(stats, other):
+    # combine the statistics of two increment ranges
+    for key in ('abs', 'rel'):
+        if other[key] > stats[key]:
+            for k in STATS:
+                if k.startswith(key):
+                    stats[k] = other[k]
+    stats['compared'] += other['compared']
+    stats['missing'] += other['missing']
+    return stats
+
+
+def compare_range(file_a, file_b, group, name, incs, rel_floor=1.0e-6):
+    # error statistics of one quantity over the increments incs
+    stats = empty_stats()
+    with marc_file.MarcFile(file_a) as mf_a, marc_file.MarcFile(file_b) as mf_b:
+        view_a = mf_a.node(name) if group == marc_h5.NODE else mf_a.element(name)
+        view_b = mf_b.node(name) if group == marc_h5.NODE else mf_b.element(name)
+        ids_a = mf_a.ids(view_a.kind)
+        index_b = mf_b.index(view_b.kind)
+        for (i, mesh_a, rows_a, a), (_, mesh_b, rows_b, b) in zip(view_a.stream(incs),
+                                                                  view_b.stream(incs)):
+            # ids of the active rows of the first file and the matching
+            # rows of the second file
+            ids = ids_a[rows_a, min(mesh_a, ids_a.shape[1]) - 1]
+            valid = np.flatnonzero(ids > 0)
+            # a mesh id with no ids in the index is looked up in mesh 1
+            # (see check_h5.check_meshes)
+            rb = id_index.lookup(index_b, ids[valid], mesh_b if mesh_b in index_b else 1,
+                                 strict=False) - rows_b.start
+            found = (rb >= 0) & (rb < len(b))
+            stats['missing'] += int(len(valid) - found.sum())
+            if not found.any():
+                continue
+            ra = valid[found]
+            rb = rb[found]
+            # errors over rows, integration points and components
+            xa = a[ra].reshape(len(ra), -1)
+            xb = b[rb].reshape(len(rb), -1)
+            err = np.abs(xa - xb)
+            stats['compared'] += err.size
+            floor = rel_floor * max(float(np.abs(xa).max()), float(np.abs(xb).max()))
+            rel = err / np.maximum(np.maximum(np.abs(xa), np.abs(xb)), floor or 1.0)
+            ncol = xa.shape[1]
+            for key, e in (('abs', err), ('rel', rel)):
+                k = int(np.argmax(e))
+                if e.flat[k] > stats[key]:
+                    stats[key] = float(e.flat[k])
+                    stats[key + '_id'] = int(ids[ra[k // ncol]])
+                    stats[key + '_inc'] = int(i)
+                    # component number (over the integration points for
+                    # element results)
+                    stats[key + '_comp'] = int(k % ncol) + 1
+    return stats
+
+
+def diff(file_a, file_b, quantities=None, incs=None, rel_floor=1.0e-6, workers=1):
+    # {(group, name): statistics} of the common quantities
+    with marc_file.MarcFile(file_a) as mf_a, marc_file.MarcFile(file_b) as mf_b:
+        common = common_quantities(mf_a, mf_b)
+        if quantities:
+            common = [(g, q) for g, q in common if q in quantities]
+            missing = set(quantities) - set(q for g, q in common)
+            if missing:
+                print('  not found in both files:', ', '.join(sorted(missing)))
+        ninc = {}
+        for group, name in common:
+            va = mf_a.node(name) if group == marc_h5.NODE else mf_a.element(name)
+            vb = mf_b.node(name) if group == marc_h5.NODE else mf_b.element(name)
+            ninc[group, name] = min(va.ninc, vb.ninc)
+            # build the id indexes once here, so that the workers only
+            # read them (see id_index.py)
+            mf_a.ids(va.kind)
+            mf_b.index(vb.kind)
+    results = {}
+    tasks = []
+    for key in common:
+        sel = marc_h5.parse_increments(incs, ninc[key])
+        results[key] = empty_stats()
+        if workers > 1:
+            # one range per worker
+            step = max(1, -(-len(sel) // workers))
+            tasks += [(key, sel[k:k + step]) for k in range(0, len(sel), step)]
+        else:
+            tasks.append((key, sel))
+    args = [[file_a] * len(tasks), [file_b] * len(tasks), [t[0][0] for t in tasks],
+            [t[0][1] for t in tasks], [t[1] for t in tasks], [rel_floor] * len(tasks)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(compare_range, *args))
+    else:
+        parts = list(map(compare_range, *args))
+    for (key, sel), stats in zip(tasks, parts):
+        merge_stats(results[key], stats)
+    return results
+
+
+def main():
+    print('\n HDF5 Results Difference')
+    print(' -----------------------\n')
+    parser = argparse.ArgumentParser(description='compare the results of two h5 files')
+    parser.add_argument('file_a')
+    parser.add_argument('file_b')
+    parser.add_argument('-q', dest='quantities', default='')
+    parser.add_argument('-i', dest='increments', default='')
+    parser.add_argument('-r', dest='rel_floor', type=float, default=1.0e-6)
+    parser.add_argument('-t', dest='tolerance', type=float, default=None)
+    parser.add_argument('-w', dest='workers', type=int, default=1)
+    parser.add_argument('-o', dest='output', default=None)
+    args = parser.parse_args()
+    quantities = [q.strip() for q in args.quantities.split(',') if q.strip()]
+    print(' HDF5 files being compared: ', args.file_a, args.file_b)
+    results = diff(args.file_a, args.file_b, quantities, args.increments, args.rel_floor,
+                   args.workers)
+    print('\n %-36s %12s %10s %6s %12s %10s %6s %9s' % ('Quantity', 'Max abs', 'Id', 'Inc',
+                                                       'Max rel', 'Id', 'Inc', 'Missing'))
+    failed = False
+    for (group, name), s in results.items():
+        if s['compared'] == 0:
+            print(' %-36s %12s' % (name, 'no rows'))
+            continue
+        print(' %-36s %12.4g %10d %6d %12.4g %10d %6d %9d' % (
+            name[0:36], s['abs'], s['abs_id'], s['abs_inc'], s['rel'], s['rel_id'],
+            s['rel_inc'], s['missing']))
+        if args.tolerance is not None and s['abs'] > args.tolerance:
+            failed = True
+    if args.output:
+        table = {'group': np.array([g.rsplit('/', 1)[1] for g, q in results]),
+                 'quantity': np.array([q for g, q in results])}
+        for k in STATS:
+            table[k] = np.array([s[k] for s in results.values()])
+        marc_h5.save_table(table, args.output)
+        print('\n Table written: ', args.output)
+    if args.tolerance is not None:
+        print('\n Tolerance %g: %s' % (args.tolerance, 'FAILED' if failed else 'passed'))
+    print('\n HDF5 Results Difference End')
+    print(' ---------------------------\n')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# ---------------------------------------------------------------------
+# description
+# script to evaluate derived results from an element quantity stored
+# with an integration point dimension, and then write them back as new
+# user-defined results to the h5 file:
+#   - "<quantity> Centroid" : element result, average of the
+#                             integration points of each element
+#   - "<quantity> Nodal"    : nodal result, average of the centroid
+#                             values of all elements sharing a node
+#
+# usage
+# open CMD shell in same folder as h5 file and then type:
+#   python element_results.py job1.h5 "Equivalent Von Mises Stress"
+# optional arguments are the component (default 0) and the number of
+# elements read at a time (default 65536):
+#   python element_results.py job1.h5 "Stress" 2 100000
+#
+# Notes:
+# the elements are processed in blocks for every increment, so the
+# memory used depends on the block size and the number of nodes but
+# not on the number of elements; there is no python loop over
+# elements or nodes.
+# only the element and node rows of the mesh id active in each
+# increment are read and written (see mesh_stream.py).
+# the nodal extrapolation is a scatter-add of the centroid values over
+# the element connectivity (np.bincount), divided by the number of
+# elements connected to each node.
+# the connectivity holds node ids (0 marks an unused position), they
+# are converted to rows of the nodal results with the id index of the
+# mesh of each increment (see id_index.py); the number of elements at
+# each node is counted again when the mesh changes.
+# ---------------------------------------------------------------------
+import numpy as np
+import sys
+
+import id_index
+import marc_h5
+import mesh_stream
+import staging
+
+
+def connectivity_rows(conn, index, mesh=1):
+    # node rows of a connectivity block of a mesh id and the matching
+    # element positions; unused positions and unknown ids are dropped
+    mask = conn > 0
+    rows = np.full(conn.shape, -1, dtype='i8')
+    rows[mask] = id_index.lookup(index, conn[mask], mesh if mesh in index else 1, strict=False)
+    return rows, rows >= 0
+
+
+def node_valence(conn_dset, index, nnode, block, erows=None, mesh=1):
+    # number of elements of the rows erows (all by default) of a mesh id
+    # connected to each node, streamed by block
+    if erows is None:
+        erows = slice(0, conn_dset.shape[0])
+    count = np.zeros(nnode, dtype='i8')
+    for e0, e1 in marc_h5.element_blocks(min(erows.stop, conn_dset.shape[0]), block, erows.start):
+        rows, mask = connectivity_rows(conn_dset[e0:e1], index, mesh)
+        count += np.bincount(rows[mask], minlength=nnode)
+    return count
+
+
+def element_results(hdf, quantity, comp=0, block=marc_h5.ELEMENT_BLOCK, out=None):
+    # read from hdf and write the user results to out (a staging file,
+    # see staging.py) or to hdf itself when out is None
+    dtype_int, dtype_float = marc_h5.file_dtypes(hdf)
+    direct = out is None
+    if direct:
+        out = hdf
+    # element quantity with the 8-D layout
+    src = hdf[marc_h5.ELEMENT + '/' + quantity]
+    nelem, nip, ncomp, ninc = src.shape[0:4]
+    print('  # Elements:\t\t', nelem)
+    print('  # Integration points:\t', nip)
+    print('  # Components:\t\t', ncomp)
+    print('  # Increments:\t\t', ninc - 1)
+    if comp >= ncomp:
+        raise ValueError('component %d not available for %s' % (comp, quantity))
+    # connectivity and number of nodes from the nodal displacements
+    conn_dset = hdf[marc_h5.CONNECTIVITY]
+    nnode = hdf[marc_h5.NODE + '/Displacement'].shape[0]
+    index = id_index.load_index(hdf, 'node')
+    # create the two user results
+    label = quantity if ncomp == 1 else '%s %d' % (quantity, comp + 1)
+    cent = marc_h5.create_user_result(out, marc_h5.ELEMENT, label + ' Centroid',
+                                      marc_h5.element_result_shape(nelem, 1, 1, ninc),
+                                      dtype_float, dtype_int)
+    nodal = marc_h5.create_user_result(out, marc_h5.NODE, label + ' Nodal',
+                                       marc_h5.node_result_shape(nnode, 1, ninc),
+                                       dtype_float, dtype_int)
+    # reusable buffers, allocated once in the file precision
+    # : read_direct fills them without a new array or a cast copy
+    # : the result buffers keep the rank of the datasets (see
+    #   marc_h5.node_sel)
+    nb = min(block, nelem)
+    ipbuf = np.empty(marc_h5.element_result_shape(nb, nip, 1, 1), dtype=src.dtype)
+    cbuf = np.empty(marc_h5.element_result_shape(nb, 1, 1, 1), dtype=dtype_float)
+    connbuf = np.empty((nb, conn_dset.shape[1]), dtype=conn_dset.dtype)
+    nbuf = np.empty(marc_h5.node_result_shape(nnode, 1, 1), dtype=dtype_float)
+    #
+    # valid element and node rows of each mesh id (remeshing)
+    meshes = mesh_stream.increment_meshes(hdf, ninc)
+    elem_spans = mesh_stream.mesh_rows(hdf, 'element')
+    node_spans = mesh_stream.mesh_rows(hdf, 'node')
+    # mesh id of the node valence in count
+    count_mesh = None
+    #
+    # -----------------------------loop over increments
+    for i in range(0, ninc):
+        mesh = int(meshes[i])
+        erows = elem_spans.get(mesh, slice(0, nelem))
+        nrows = node_spans.get(mesh, slice(0, nnode))
+        nrows = slice(nrows.start, min(nrows.stop, nnode))
+        # node valence of the elements of the mesh, counted again only
+        # when the mesh changes
+        if mesh != count_mesh:
+            count = node_valence(conn_dset, index, nnode, block, erows, mesh)
+            # avoid division by zero for nodes without elements
+            count[count == 0] = 1
+            count_mesh = mesh
+        # nodal accumulator for one increment
+        acc = np.zeros(nnode, dtype='f8')
+        # -----------------------------loop over the element blocks of the mesh
+        for e0, e1 in marc_h5.element_blocks(min(erows.stop, nelem), block, erows.start):
+            n = e1 - e0
+            # hyperslab: block of elements, all integration points
+            src.read_direct(ipbuf, marc_h5.element_sel(i, slice(e0, e1), comp=comp), np.s_[0:n])
+            np.mean(ipbuf[0:n], axis=1, keepdims=True, out=cbuf[0:n])
+            cent.write_direct(cbuf, np.s_[0:n], marc_h5.element_sel(i, slice(e0, e1)))
+            # scatter the centroid value to the element nodes
+            conn_dset.read_direct(connbuf, np.s_[e0:e1], np.s_[0:n])
+            rows, mask = connectivity_rows(connbuf[0:n], index, mesh)
+            c = cbuf[0:n, 0, 0, 0, 0, 0, 0, 0]
+            w = np.broadcast_to(c[:, None], rows.shape)[mask]
+            acc += np.bincount(rows[mask], weights=w, minlength=nnode)
+        np.divide(acc, count, out=nbuf[:, 0, 0, 0, 0, 0, 0], casting='unsafe')
+        nodal.write_direct(nbuf, nrows, marc_h5.node_sel(i, nrows))
+    # register the user post codes (done by staging.publish otherwise)
+    if direct:
+        marc_h5.sync_post_summary(hdf, marc_h5.ELEMENT, dtype_int)
+        marc_h5.sync_post_summary(hdf, marc_h5.NODE, dtype_int)
+
+
+def main():
+    print('\n HDF5 Element Results Processing')
+    print(' -------------------------------\n')
+    # specify h5 results file and element quantity
+    if len(sys.argv) > 2:
+        file = sys.argv[1]
+        quantity = sys.argv[2]
+    else:
+        file = input("Enter HDF5 file : ")
+        quantity = input("Enter element quantity : ")
+    comp = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    block = int(sys.argv[4]) if len(sys.argv) > 4 else marc_h5.ELEMENT_BLOCK
+    print(' HDF5 file being used: ', file)
+    print(' Element quantity:\t', quantity)
+    # the file is read-only during the computation and only locked to
+    # publish the results (see staging.py)
+    with staging.open_staging(file) as (hdf, stg):
+        element_results(hdf, quantity, comp, block, stg)
+    staging.publish(file)
+    print('\n HDF5 Element Results Processing End')
+    print(' -----------------------------------\n')
+
+
+if __name__ == '__main__':
+    main()
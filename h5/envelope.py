@@ -0,0 +1,143 @@
+# ---------------------------------------------------------------------
+# description
+# script to compute the envelope (maximum and minimum over time) of a
+# nodal or element quantity, with the increment where each node
+# (element integration point) peaks, and then write it back as a new
+# user-defined result "<quantity> Envelope" with the components
+#   1 : maximum up to the increment
+#   2 : increment number of the maximum
+#   3 : minimum up to the increment
+#   4 : increment number of the minimum
+#
+# usage
+# open CMD shell in same folder as h5 file and then type:
+#   python envelope.py job1.h5 "Equivalent Von Mises Stress"
+# optional argument is the scalar taken from the quantity, a component
+# number (default 1) or a derived result of parallel_results.py
+# (resultant, magnitude, max_abs):
+#   python envelope.py job1.h5 Displacement resultant
+#
+# Notes:
+# the increments are streamed once (see mesh_stream.py) with running
+# max/min/argmax/argmin arrays, so the memory used is a few arrays of
+# one increment whatever the number of increments.
+# the running envelope is written at every increment, so the last
+# increment holds the envelope of the whole analysis and Mentat can
+# show how it builds up. nodes (elements) not active yet are 0.
+# ---------------------------------------------------------------------
+import numpy as np
+import sys
+
+import marc_file
+import marc_h5
+import parallel_results
+import staging
+
+
+def envelope(hdf, quantity, scalar='1', out=None):
+    # read from hdf and write the envelope to out (a staging file, see
+    # staging.py) or to hdf itself when out is None; returns (max,
+    # increment, id) of the largest value
+    mf = marc_file.MarcFile(hdf)
+    dtype_int, dtype_float = mf.dtypes
+    direct = out is None
+    if direct:
+        out = hdf
+    src = mf.quantity(quantity)
+    group = marc_h5.ELEMENT if src.element else marc_h5.NODE
+    nrow, ninc = len(src), src.ninc
+    if scalar in parallel_results.DERIVED:
+        derived, comp = parallel_results.DERIVED[scalar], slice(None)
+        label = '%s %s Envelope' % (quantity, scalar)
+    else:
+        c = int(scalar) - 1
+        if c < 0 or c >= src.ncomp:
+            raise ValueError('component %s not available for %s' % (scalar, quantity))
+        derived, comp = None, slice(c, c + 1)
+        label = quantity if src.ncomp == 1 else '%s %d' % (quantity, c + 1)
+        label += ' Envelope'
+    if src.element:
+        shape = marc_h5.element_result_shape(nrow, src.nip, 4, ninc)
+    else:
+        shape = marc_h5.node_result_shape(nrow, 4, ninc)
+    env = marc_h5.create_user_result(out, group, label, shape, dtype_float, dtype_int)
+    print('  # Increments:\t', ninc - 1)
+    # running arrays of one increment, (nrow,) or (nrow, nip)
+    inc = mf.increment_times(ninc)[0]
+    size = (nrow, src.nip) if src.element else (nrow,)
+    vmax = np.zeros(size, dtype=dtype_float)
+    vmin = np.zeros(size, dtype=dtype_float)
+    imax = np.zeros(size, dtype='i8')
+    imin = np.zeros(size, dtype='i8')
+    seen = np.zeros(nrow, dtype=bool)
+    val = np.empty(size, dtype=dtype_float)
+    # write buffer with the rank of the dataset (see marc_h5.node_sel)
+    if src.element:
+        buf = np.zeros(marc_h5.element_result_shape(nrow, src.nip, 4, 1), dtype=dtype_float)
+    else:
+        buf = np.zeros(marc_h5.node_result_shape(nrow, 4, 1), dtype=dtype_float)
+    comps = buf[:, :, :, 0, 0, 0, 0, 0] if src.element else buf[:, :, 0, 0, 0, 0, 0]
+    #
+    # -----------------------------loop over increments
+    for i, mesh, rows, data in src.stream(comp=comp):
+        n = rows.stop - rows.start
+        if n > 0:
+            v = val[0:n]
+            if derived is None:
+                v[...] = data[..., 0]
+            else:
+                derived(data, v)
+            # views of the rows of the active mesh id, updated in place
+            vx, vn, ix, im = vmax[rows], vmin[rows], imax[rows], imin[rows]
+            first = ~seen[rows]
+            if src.element:
+                first = first[:, None]
+            up = first | (v > vx)
+            vx[up] = v[up]
+            ix[up] = inc[i]
+            down = first | (v < vn)
+            vn[down] = v[down]
+            im[down] = inc[i]
+            seen[rows] = True
+        comps[..., 0] = vmax
+        comps[..., 1] = imax
+        comps[..., 2] = vmin
+        comps[..., 3] = imin
+        env.write_direct(buf, None, marc_h5.element_sel(i) if src.element else marc_h5.node_sel(i))
+    # register the user post code (done by staging.publish otherwise)
+    if direct:
+        marc_h5.sync_post_summary(hdf, group, dtype_int)
+    if not seen.any():
+        return None
+    # largest value of the envelope
+    k = np.argmax(np.where(seen.reshape((nrow,) + (1,) * (vmax.ndim - 1)), vmax, -np.inf))
+    k = np.unravel_index(k, vmax.shape)
+    # id of the row in the mesh id of the peak increment
+    mesh = mf.increment_meshes(ninc)[np.flatnonzero(inc == imax[k])[0]]
+    ids = mf.ids(src.kind)
+    return vmax[k], imax[k], ids[k[0], min(mesh, ids.shape[1]) - 1]
+
+
+def main():
+    print('\n HDF5 Envelope Processing')
+    print(' ------------------------\n')
+    if len(sys.argv) > 2:
+        file = sys.argv[1]
+        quantity = sys.argv[2]
+    else:
+        file = input("Enter HDF5 file : ")
+        quantity = input("Enter quantity : ")
+    scalar = sys.argv[3] if len(sys.argv) > 3 else '1'
+    print(' HDF5 file being used: ', file)
+    print(' Quantity:\t', quantity)
+    with staging.open_staging(file) as (hdf, stg):
+        peak = envelope(hdf, quantity, scalar, stg)
+    if peak is not None:
+        print('\n  Maximum: %g at id %d, increment %d' % (peak[0], peak[2], peak[1]))
+    staging.publish(file)
+    print('\n HDF5 Envelope Processing End')
+    print(' ----------------------------\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# ---------------------------------------------------------------------
+# description
+# script to export nodal or element results of a Marc h5 file to a
+# compressed columnar format for data analysis: Parquet (when pyarrow
+# is installed) or numpy .npz shards
+#
+# usage
+# open CMD shell in same folder as h5 file and then type:
+#   python export_columnar.py job1.h5 -q Displacement
+#   python export_columnar.py job1.h5 -q "Displacement,Temperature" -i 10:50 -f npz
+#   python export_columnar.py job1.h5 -g element -q "Equivalent Von Mises Stress"
+# options:
+#   -q  quantity names (comma separated)
+#   -g  result group, node (default) or element
+#   -i  increments, as first:last (last excluded) or a comma separated
+#       list (default: all)
+#   -b  number of increments per batch (default 10)
+#   -f  format, parquet or npz (default: parquet if pyarrow is
+#       installed, otherwise npz)
+#   -o  output name without extension (default <job>_<group>)
+#
+# Notes:
+# the table has one row per id (and integration point for element
+# results) and increment, with the columns
+#   id, [ip,] increment, time, <quantity> <component> ...
+# only the rows of the mesh id active in each increment are exported
+# (see mesh_stream.py), the ids come from the id index (see id_index.py).
+# the increments are read in batches: the memory used is bounded by the
+# rows of one batch. with parquet every batch is a row group of
+# <output>.parquet, with npz every batch is a shard <output>_00000.npz.
+# ---------------------------------------------------------------------
+import numpy as np
+import argparse
+import os
+
+import marc_file
+import marc_h5
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+PARQUET_COMPRESSION = 'zstd'
+
+
+def column_labels(quantity, ncomp):
+    if ncomp == 1:
+        return [quantity]
+    return ['%s %d' % (quantity, c + 1) for c in range(ncomp)]
+
+
+def read_batch(views, ids, incs, inc, times):
+    # columns of the increments incs for the result views (same group)
+    element = views[0].element
+    streams = [v.stream(incs) for v in views]
+    parts = []
+    for items in zip(*streams):
+        i, mesh, rows = items[0][0:3]
+        n = rows.stop - rows.start
+        if n == 0:
+            continue
+        # ids of the active mesh id; rows without id (0) are skipped
+        rid = ids[rows, min(mesh, ids.shape[1]) - 1]
+        valid = rid > 0
+        nip = items[0][3].shape[1] if element else 1
+        part = {'id': np.repeat(rid[valid], nip)}
+        if element:
+            part['ip'] = np.tile(np.arange(1, nip + 1, dtype='i4'), int(valid.sum()))
+        m = len(part['id'])
+        part['increment'] = np.full(m, inc[i], dtype='i8')
+        part['time'] = np.full(m, times[i])
+        for view, item in zip(views, items):
+            data = item[3][valid].reshape(m, -1)
+            for c, label in enumerate(column_labels(view.name, data.shape[1])):
+                part[label] = data[:, c].copy()
+        parts.append(part)
+    if not parts:
+        return None
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def export(filename, quantities, group='node', incs=None, batch=10, fmt=None, output=None):
+    fmt = fmt or ('parquet' if pa is not None else 'npz')
+    if fmt == 'parquet' and pa is None:
+        raise ImportError('pyarrow is required for the parquet format, use -f npz')
+    output = output or '%s_%s' % (os.path.splitext(filename)[0], group)
+    written = []
+    with marc_file.MarcFile(filename) as mf:
+        views = [mf.node(q) if group == 'node' else mf.element(q) for q in quantities]
+        ninc = min(v.ninc for v in views)
+        if isinstance(incs, str) or incs is None:
+            incs = marc_h5.parse_increments(incs, ninc)
+        inc, times = mf.increment_times(ninc)
+        ids = mf.ids(group)
+        print('  # Increments:\t', len(incs))
+        print('  # Batches:\t', (len(incs) + batch - 1) // batch)
+        writer = None
+        try:
+            for k in range(0, len(incs), batch):
+                table = read_batch(views, ids, incs[k:k + batch], inc, times)
+                if table is None:
+                    continue
+                if fmt == 'parquet':
+                    tb = pa.table(table)
+                    if writer is None:
+                        written.append(output + '.parquet')
+                        writer = pq.ParquetWriter(written[-1], tb.schema,
+                                                  compression=PARQUET_COMPRESSION)
+                    writer.write_table(tb)
+                else:
+                    written.append('%s_%05d.npz' % (output, k // batch))
+                    np.savez_compressed(written[-1], **table)
+                print('  Increments %d-%d: %d rows' % (incs[k], incs[min(k + batch, len(incs)) - 1],
+                                                     len(table['id'])))
+        finally:
+            if writer is not None:
+                writer.close()
+    return written
+
+
+def main():
+    print('\n HDF5 Columnar Export')
+    print(' --------------------\n')
+    parser = argparse.ArgumentParser(description='export h5 results to parquet or npz shards')
+    parser.add_argument('file')
+    parser.add_argument('-q', dest='quantities', default='Displacement')
+    parser.add_argument('-g', dest='group', default='node', choices=('node', 'element'))
+    parser.add_argument('-i', dest='increments', default='')
+    parser.add_argument('-b', dest='batch', type=int, default=10)
+    parser.add_argument('-f', dest='format', default=None, choices=('parquet', 'npz'))
+    parser.add_argument('-o', dest='output', default=None)
+    args = parser.parse_args()
+    quantities = [q.strip() for q in args.quantities.split(',') if q.strip()]
+    print(' HDF5 file being used: ', args.file)
+    written = export(args.file, quantities, args.group, args.increments, max(1, args.batch),
+                     args.format, args.output)
+    for f in written:
+        print(' Written: ', f)
+    print('\n HDF5 Columnar Export End')
+    print(' ------------------------\n')
+
+
+if __name__ == '__main__':
+    main()
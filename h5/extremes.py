@@ -0,0 +1,162 @@
+# ---------------------------------------------------------------------
+# description
+# script to find the extreme values of the results of a Marc h5 file:
+# for every quantity and component, the maximum and the minimum over
+# all nodes (elements, integration points) and increments, with the
+# node (element) id, integration point and increment where they occur
+#
+# usage
+# open CMD shell in same folder as h5 file and then type:
+#   python extremes.py job1.h5
+#   python extremes.py job1.h5 -q "Displacement,Equivalent Von Mises Stress" -o extremes.csv
+# options:
+#   -q  quantity names (comma separated, default: all nodal and element
+#       results)
+#   -i  increments, as first:last or a comma separated list (default all)
+#   -o  output table, .npz or .csv
+#
+# Notes:
+# every quantity is streamed once (see mesh_stream.py) and each
+# increment is reduced with one argmax/argmin per component, so the
+# memory used is one increment whatever the number of increments.
+# nodal results with 2 or 3 components get one more column, the
+# magnitude of the vector.
+# the same Extremes accumulator is used by the headless report
+# (REPORT/report_headless.py) for .t16 files read with py_post.
+# ---------------------------------------------------------------------
+import numpy as np
+import argparse
+
+import marc_file
+import marc_h5
+import parallel_results
+
+COLUMNS = ('quantity', 'component', 'max', 'max_id', 'max_ip', 'max_inc', 'max_time',
+           'min', 'min_id', 'min_ip', 'min_inc', 'min_time')
+
+
+class Extremes:
+    # running max/min of the columns of one quantity
+
+    def __init__(self, labels):
+        self.labels = list(labels)
+        n = len(self.labels)
+        self.vmax = np.full(n, -np.inf)
+        self.vmin = np.full(n, np.inf)
+        # id, integration point, increment, time of each extreme
+        self.amax = np.zeros((n, 4))
+        self.amin = np.zeros((n, 4))
+
+    def update(self, inc, time, ids, values):
+        # values of one increment, (nrow, nip, ncol), for the rows with
+        # ids (nrow,); rows with id <= 0 are not active
+        valid = ids > 0
+        if not valid.all():
+            ids, values = ids[valid], values[valid]
+        if len(ids) == 0:
+            return
+        nip = values.shape[1]
+        flat = values.reshape(-1, values.shape[2])
+        cols = np.arange(flat.shape[1])
+        for v, a, k, better in ((self.vmax, self.amax, np.argmax(flat, axis=0), np.greater),
+                                (self.vmin, self.amin, np.argmin(flat, axis=0), np.less)):
+            x = flat[k, cols]
+            up = better(x, v)
+            if up.any():
+                v[up] = x[up]
+                a[up, 0] = ids[k[up] // nip]
+                a[up, 1] = k[up] % nip + 1
+                a[up, 2] = inc
+                a[up, 3] = time
+
+    def rows(self, quantity):
+        # one table row per column (see COLUMNS), columns never updated
+        # are left out
+        rows = []
+        for c, label in enumerate(self.labels):
+            if np.isfinite(self.vmax[c]):
+                amax, amin = self.amax[c], self.amin[c]
+                rows.append([quantity, label, float(self.vmax[c]), int(amax[0]), int(amax[1]),
+                             int(amax[2]), float(amax[3]), float(self.vmin[c]), int(amin[0]),
+                             int(amin[1]), int(amin[2]), float(amin[3])])
+        return rows
+
+
+def column_labels(ncomp, vector):
+    # component labels, plus the magnitude of a vector
+    labels = [str(c + 1) for c in range(ncomp)]
+    if vector:
+        labels.append('magnitude')
+    return labels
+
+
+def quantity_extremes(mf, name, incs=None):
+    # table rows of the extremes of one quantity of a MarcFile
+    view = mf.quantity(name)
+    vector = not view.element and view.ncomp in (2, 3)
+    ext = Extremes(column_labels(view.ncomp, vector))
+    inc, time = mf.increment_times(view.ninc)
+    ids_all = mf.ids(view.kind)
+    buf = None
+    for i, mesh, rows, data in view.stream(incs):
+        ids = ids_all[rows, min(mesh, ids_all.shape[1]) - 1]
+        values = data if view.element else data[:, None, :]
+        if vector:
+            # components and magnitude side by side
+            if buf is None:
+                buf = np.empty((len(ids_all), 1, view.ncomp + 1), dtype=values.dtype)
+            v = buf[0:len(ids)]
+            v[..., 0:view.ncomp] = values
+            parallel_results.magnitude(values, v[..., view.ncomp])
+            values = v
+        ext.update(inc[i], time[i], ids, values)
+    return ext.rows(name)
+
+
+def extremes(filename, quantities=None, incs=None):
+    # table rows of the extremes of the quantities of an h5 file (all
+    # the nodal and element results when quantities is empty)
+    with marc_file.MarcFile(filename) as mf:
+        names = mf.quantities(marc_h5.NODE) + mf.quantities(marc_h5.ELEMENT)
+        if quantities:
+            missing = [q for q in quantities if q not in names]
+            if missing:
+                print('  not found:', ', '.join(missing))
+            quantities = [q for q in quantities if q in names]
+        else:
+            quantities = names
+        rows = []
+        for name in quantities:
+            view = mf.quantity(name)
+            sel = marc_h5.parse_increments(incs, view.ninc)
+            rows += quantity_extremes(mf, name, sel)
+    return rows
+
+
+def main():
+    print('\n HDF5 Extreme Values')
+    print(' -------------------\n')
+    parser = argparse.ArgumentParser(description='extreme values of the results of an h5 file')
+    parser.add_argument('file')
+    parser.add_argument('-q', dest='quantities', default='')
+    parser.add_argument('-i', dest='increments', default='')
+    parser.add_argument('-o', dest='output', default=None)
+    args = parser.parse_args()
+    quantities = [q.strip() for q in args.quantities.split(',') if q.strip()]
+    print(' HDF5 file being used: ', args.file)
+    rows = extremes(args.file, quantities, args.increments)
+    print('\n %-36s %9s %12s %10s %4s %6s %12s %10s %4s %6s' % (
+        'Quantity', 'Comp', 'Max', 'Id', 'IP', 'Inc', 'Min', 'Id', 'IP', 'Inc'))
+    for r in rows:
+        print(' %-36s %9s %12.4g %10d %4d %6d %12.4g %10d %4d %6d' % (
+            r[0][0:36], r[1], r[2], r[3], r[4], r[5], r[7], r[8], r[9], r[10]))
+    if args.output:
+        table = {k: np.array([r[c] for r in rows]) for c, k in enumerate(COLUMNS)}
+        marc_h5.save_table(table, args.output)
+        print('\n Table written: ', args.output)
+    print('\n HDF5 Extreme Values End')
+    print(' -----------------------\n')
+
+
+if __name__ == '__main__':
+    main()
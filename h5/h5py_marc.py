@@ -33,9 +33,12 @@
 # ---------------------------------------------------------------------
 import numpy as np
 import h5py
-import math
 import sys
 
+import marc_file
+import marc_h5
+import staging
+
 #
 print('\n HDF5 Results File Processing')
 print(' ----------------------------\n')
@@ -49,11 +52,16 @@ else:
 print(' HDF5 file being used: ', file)
 
 # open the h5 results file with hdf specified
-# as the object - (a)ppend mode)
+# as the object - (r)ead-only mode) and a
+# staging file stg for the new user results
+# : the results file is not locked while the
+#   results are computed, Mentat can still
+#   read it. the user results are copied into
+#   it at the end by staging.publish
 # : in conjunction with a with-statement,
 #   myfile.close() will be called automatically
 #   when python leaves the with-statement
-with h5py.File(file, 'a') as hdf:
+with staging.open_staging(file) as (hdf, stg):
     #
     # ---------------------------------------------------------------------
     # high level commands to interrogate the h5 file
@@ -150,22 +158,20 @@ with h5py.File(file, 'a') as hdf:
     # extract the 'precision' attribute for
     # the h5 file. corresponding line in xml is...
     # : <attribute name="precision" type="integer" description="0:Single Precision, 1:Double Precision"/>
-    precision = g1.attrs.get('precision')
+    # : the attribute is decoded once and cached
+    #   by the MarcFile accessor (see
+    #   marc_file.py), which the other h5 tools
+    #   share
+    mf = marc_file.MarcFile(hdf)
     # it could be single or double precision
-    if precision[0] == 0:
-        prec = 'Single'
-    elif precision[0] == 1:
-        prec = 'Double'
+    prec = mf.precision
     # inform user
     print(' : H5 File precision:\t', prec)
     # set data types based on precision for
     # later use
-    if precision[0] == 0:
-        dtype_int = 'i4'
-        dtype_float = 'float32'
-    elif precision[0] == 1:
-        dtype_int = 'i8'
-        dtype_float = 'float64'
+    # : 'i4'/'float32' (single) or 'i8'/'float64'
+    #   (double)
+    dtype_int, dtype_float = mf.dtypes
     #
     # ---------------------------------------------------------------------
     # extract a summary of the h5 result file data
@@ -267,9 +273,10 @@ with h5py.File(file, 'a') as hdf:
     # define object pointing to the nodal
     # displacement section of the h5 file
     gd = hdf.get('Marc/Results/Node')
-    # create an array using numpy from the
-    # h5 "displacement" result object
-    disp = np.array(gd.get('Displacement'))
+    # define the h5 "displacement" result object
+    # : a lazy view, the data is not read here,
+    #   it is read one increment at a time below
+    disp = mf.node('Displacement')
     # print result attributes ?????
     print('  Postcode: ', gd.attrs.get('postcode'))
     print('  User_post_label: ', gd.attrs.get('user_post_label'))
@@ -277,31 +284,36 @@ with h5py.File(file, 'a') as hdf:
     # : this is the maximum dimension of the
     #   nodal vector - and so accounts for
     #   remeshing
-    nnode = disp.shape[0]
-    ndof = disp.shape[1]
+    nnode = len(disp)
+    ndof = disp.ncomp
     # : adjust because of zero-based vectors
-    ninc = disp.shape[2]
+    ninc = disp.ninc
     # inform user
     print('  # Nodes:\t', nnode)
     print('  # DoF:\t', ndof)
     print('  # Increments:\t', ninc - 1)
-    # create and populate an array of the
-    # same shape as "disp" with resultant
-    # displacement values
-    Resultant = np.zeros((nnode, 1, ninc, 1, 1, 1, 1))
+    # create the new user defined "Resultant"
+    # dataset in the file precision, with the
+    # same layout as "disp"
+    # : it is written to the staging file
+    Resultant = marc_h5.create_user_result(stg, 'Marc/Results/Node', 'Resultant',
+                                           marc_h5.node_result_shape(nnode, 1, ninc),
+                                           dtype_float, dtype_int)
+    # reusable buffer in the file precision
+    # : the 7-D rank of the datasets is kept
+    #   (see marc_h5.node_sel)
+    mag = np.empty(marc_h5.node_result_shape(nnode, 1, 1), dtype=dtype_float)
     #
     # -----------------------------loop over increments
-    for i in range(0, ninc):
-        i += 1
-        # -----------------------------loop over nodes
-        for k in range(0, nnode):
-            k += 1
-            # extract x/y-displacements
-            x = disp[k - 1, 0, i - 1, 0, 0, 0, 0]
-            y = disp[k - 1, 1, i - 1, 0, 0, 0, 0]
-            # evaluate resultant and store
-            mag = math.sqrt(x * x + y * y)
-            Resultant[k - 1, 0, i - 1, 0, 0, 0, 0] = mag
+    # : stream reads the x/y-displacements
+    #   of the nodes of the mesh id active in
+    #   the increment only (remeshing), into a
+    #   reusable buffer with read_direct
+    for i, mesh, rows, xy in disp.stream(comp=slice(0, 2)):
+        n = xy.shape[0]
+        # evaluate resultant and store
+        np.hypot(xy[:, 0], xy[:, 1], out=mag[0:n, 0, 0, 0, 0, 0, 0])
+        Resultant.write_direct(mag, np.s_[0:n], marc_h5.node_sel(i, rows))
     #
     # ---------------------------------------------------------------------
     # extract and print nodal result details
@@ -350,86 +362,23 @@ with h5py.File(file, 'a') as hdf:
         #   <column 3 description="0:Global XYZ 1:Shell Top-Middle-Bottom 2:List eg.1,2,3 (used only for UPSTNO_HDF)"/>
         #   <column 4 description="0:default 1:modal 2:buckle 3:harmonic real 4:harmonic real/imaginary 5:harmonic magnitude/phase"/>
         print('      : # DoFs\t\t :', node_post_summary[i][2][0][0][0][0][0])
-    # extract size of secondary data for
-    # later use
-    npsize = node_post_summary.shape[1]
-    #
-    # ---------------------------------------------------------------------
-    # check whether there are any duplicate post codes in the dataset -
-    # this means that this script has been run before and a further entry
-    # has been made in to the post summary dataset, which needs to be
-    # removed. it is not sufficient to simply delete the dataset as per
-    # the line below: del hdf['/Marc/Results/Node/Resultant']
-    # ---------------------------------------------------------------------
-    #
-    # -----------------------------loop over the post codes
-    iuser = 0
-    for i in range(0, npcode):
-        # extract result post codes - a "-1"
-        # represents a user post code
-        pclabel = node_post_summary[i][0][0][0][0][0][0]
-        #
-        if pclabel == -1:
-            # set flag to indicate that a user result
-            # is already present
-            iuser = 1
     # inform user of overall node post
     # summary dimensions
     print(' Node_Post_Summary Shape: ', node_post_summary.shape)
-    #
-    # ---------------------------------------------------------------------
-    # add user defined nodal post code to Node Post Summary
-    # ---------------------------------------------------------------------
-    #
-    # define new array of the same shape as
-    # defined in the xml template:
-    # <dataset name="Nodal_Result_Quantity_Name" ndims="7 { -1,3,-1,-1,-1,2,-1}" description="Appendix Table 2">
-    user_postcode = np.zeros((1, npsize, ninc, 1, 1, 1, 1))
-    # define the user post code as "1" in
-    # the 3rd field for all increments - there
-    # is only 1 result being created
-    # : the "-" denotes a user field
-    user_postcode[0, 0, 0:ninc, 0, 0, 0, 0] = -1
-    # define the number of Dofs
-    user_postcode[0, 2, 0:ninc, 0, 0, 0, 0] = 1
-    # append new node post summary
-    if iuser == 0:
-        node_post_summary = np.append(node_post_summary, user_postcode, axis=0)
-        print('\n  No user result detected - Appending new results')
-    # delete user results from the dataset if
-    # present:
-    if '/Marc/Results/Node/Resultant' in hdf:
-        del hdf['/Marc/Results/Node/Resultant']
-        print('\n  Old user result deleted...Resultant')
-    # write new user defined nodal results
-    # to new "Resultant" dataset
-    dset = hdf.create_dataset('/Marc/Results/Node/Resultant', dtype=dtype_float, data=Resultant)
-    print('\n  New user result created...Resultant')
-    # add post code value attribute to the
-    # Resultant dataset
-    user_post = [-1]
-    dset.attrs.create('postcode', user_post, dtype=dtype_int)
-    # create new postcode result label
-    user_pst_lb = 'Resultant'
-    # create a typed null-terminated
-    # fixed-length string (C_S1) using h5t
-    # : FORTRAN_S1 = Zero padded fixed-length string
-    # : VARIABLE = Variable-length string
-    tid = h5py.h5t.TypeID.copy(h5py.h5t.C_S1)
-    # set the size of the string to match that
-    # of the new postcode label
-    tid.set_size(len(user_pst_lb))
-    # create the postcode label as an attribute
-    # of this dataset
-    # : changing user_post_label to anything
-    #   other than 'user_post_label' will crash
-    #   Mentat when trying to access results
-    dset.attrs.create('user_post_label', user_pst_lb, None, tid)
-    # delete old node post summary from h5
-    del hdf['Marc/Results/Node/Node Post Summary']
-    # create new node post summary updated
-    # with user postcode
-    dset = hdf.create_dataset('/Marc/Results/Node/Node Post Summary', dtype=dtype_int, data=node_post_summary)
+#
+# ---------------------------------------------------------------------
+# add user defined nodal post code to Node Post Summary
+#
+# the "Resultant" dataset was created in the staging file with the
+# "postcode" (-1) and the "user_post_label" attributes. the results
+# file is now opened in (a)ppend mode only to copy the "Resultant"
+# dataset and to rebuild the node post summary with one "-1" row per
+# user result - so a second run of this script does not add a
+# duplicate post code (it is not sufficient to simply delete the
+# dataset: del hdf['/Marc/Results/Node/Resultant'])
+# ---------------------------------------------------------------------
+#
+staging.publish(file)
 #
 print('\n HDF5 Results File Processing End')
 print(' ----------------------------------\n')
@@ -0,0 +1,181 @@
+# ---------------------------------------------------------------------
+# description
+# node/element id -> array row index of a Marc h5 result file
+#
+# the h5 tools used to assume that the row of a result array is the
+# node (element) id minus one. this is not true after remeshing or
+# with a non-contiguous numbering. this module builds, for each mesh
+# id, the sorted list of external ids and the matching rows, so that
+# a set of ids is converted to rows with one vectorised searchsorted.
+#
+# usage
+#   import id_index
+#   index = id_index.load_index(hdf, 'node')
+#   rows = id_index.lookup(index, [10, 25, 300], mesh=1)
+# or from a CMD shell, to build the index file in advance:
+#   python id_index.py job1.h5
+#
+# Notes:
+# the index is stored next to the h5 file as <file>.idx.npz, so the
+# result file itself is never modified. it is rebuilt automatically
+# when the size or the modification time of the h5 file change.
+# the ids are read from the datasets NODE_IDS / ELEMENT_IDS below,
+# with one column per mesh id (0 = unused row). files without these
+# datasets use row = id - 1, for the number of nodes (elements) of each
+# mesh id in Analysis Data.
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+import os
+import sys
+import zipfile
+
+import marc_h5
+
+NODE_IDS = 'Marc/Input/Node/Node ID'
+ELEMENT_IDS = 'Marc/Input/Element/Element ID'
+# format of the index file, an older index file is built again
+INDEX_VERSION = 2
+
+
+def index_path(filename):
+    # name of the index file next to the h5 file
+    return filename + '.idx.npz'
+
+
+def file_stamp(filename):
+    # size and modification time used to detect a changed h5 file
+    st = os.stat(filename)
+    return np.array([st.st_size, st.st_mtime_ns], dtype='i8')
+
+
+def read_ids(hdf, kind):
+    # external ids with shape (nrows, nmesh)
+    path = NODE_IDS if kind == 'node' else ELEMENT_IDS
+    if path in hdf:
+        ids = hdf[path][()]
+        if ids.ndim == 1:
+            ids = ids[:, None]
+        return ids.astype('i8')
+    # no id dataset: row = id - 1, for the rows of every mesh id of
+    # Analysis Data (row 1 = # nodes, row 2 = # elements)
+    if kind == 'node':
+        nrow = hdf[marc_h5.NODE + '/Displacement'].shape[0]
+    else:
+        nrow = hdf[marc_h5.CONNECTIVITY].shape[0]
+    counts = []
+    if marc_h5.ANALYSIS_DATA in hdf:
+        gs = hdf[marc_h5.ANALYSIS_DATA][()]
+        counts = [min(int(n), nrow) for n in gs[1 if kind == 'node' else 2, 0, :]]
+    if not any(n > 0 for n in counts):
+        return np.arange(1, nrow + 1, dtype='i8')[:, None]
+    ids = np.zeros((nrow, len(counts)), dtype='i8')
+    for m, n in enumerate(counts):
+        ids[0:n, m] = np.arange(1, n + 1)
+    return ids
+
+
+def build_index(hdf, kind):
+    # dictionary {mesh id: (sorted ids, rows)}
+    ids = read_ids(hdf, kind)
+    index = {}
+    for m in range(ids.shape[1]):
+        rows = np.flatnonzero(ids[:, m] > 0)
+        order = np.argsort(ids[rows, m], kind='stable')
+        index[m + 1] = (ids[rows[order], m], rows[order])
+    return index
+
+
+def save_index(filename, indexes):
+    # write the indexes {kind: index} next to the h5 file
+    data = {'stamp': file_stamp(filename), 'version': np.array(INDEX_VERSION)}
+    for kind, index in indexes.items():
+        for m, (ids, rows) in index.items():
+            data['%s_ids_%d' % (kind, m)] = ids
+            data['%s_rows_%d' % (kind, m)] = rows
+    # written to a temporary file and renamed, so that a process reading
+    # the index never sees a partial file
+    path = index_path(filename)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as fileo:
+        np.savez(fileo, **data)
+    os.replace(tmp, path)
+
+
+def read_index(filename, kind):
+    # index from the file next to the h5 file, None if missing or out
+    # of date
+    path = index_path(filename)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if not np.array_equal(data['stamp'], file_stamp(filename)):
+                return None
+            if 'version' not in data.files or int(data['version']) != INDEX_VERSION:
+                return None
+            index = {}
+            for key in data.files:
+                if key.startswith(kind + '_ids_'):
+                    m = int(key.rsplit('_', 1)[1])
+                    index[m] = (data[key], data['%s_rows_%d' % (kind, m)])
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        # unreadable index file: rebuilt by the caller
+        return None
+    return index or None
+
+
+def load_index(hdf, kind):
+    # index of an open h5 file: read from the index file when up to
+    # date, otherwise built from the file and stored for the next run
+    filename = hdf.filename
+    index = read_index(filename, kind)
+    if index is None:
+        index = build_index(hdf, kind)
+        other = 'element' if kind == 'node' else 'node'
+        indexes = {kind: index}
+        saved = read_index(filename, other)
+        if saved is not None:
+            indexes[other] = saved
+        try:
+            save_index(filename, indexes)
+        except OSError:
+            # read-only folder: the index is only kept in memory
+            pass
+    return index
+
+
+def lookup(index, ids, mesh=1, strict=True):
+    # rows of the given ids for a mesh id; unknown ids give -1, or a
+    # KeyError when strict
+    sorted_ids, rows = index[mesh]
+    ids = np.asarray(ids, dtype='i8')
+    pos = np.searchsorted(sorted_ids, ids)
+    pos[pos >= len(sorted_ids)] = 0
+    found = sorted_ids[pos] == ids if len(sorted_ids) else np.zeros(ids.shape, bool)
+    out = np.where(found, rows[pos] if len(rows) else -1, -1)
+    if strict and not found.all():
+        missing = np.unique(ids[~found])
+        raise KeyError('ids not found in mesh %d: %s' % (mesh, missing[:10].tolist()))
+    return out
+
+
+def main():
+    # build the index file of an h5 file
+    if len(sys.argv) > 1:
+        file = sys.argv[1]
+    else:
+        file = input("Enter HDF5 file : ")
+    print(' HDF5 file being used: ', file)
+    with h5py.File(file, 'r') as hdf:
+        indexes = {}
+        for kind in ('node', 'element'):
+            indexes[kind] = build_index(hdf, kind)
+            for m, (ids, rows) in indexes[kind].items():
+                print('  %-8s mesh %d: %d ids' % (kind, m, len(ids)))
+    save_index(file, indexes)
+    print(' Index written: ', index_path(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+# ---------------------------------------------------------------------
+# description
+# lazy accessor of a Marc h5 result file: the file is opened once, the
+# metadata (precision, Summary columns, post summaries, id index, mesh
+# rows, decoded attributes) is read on first use and cached, and the
+# results are array-like views that only read the part that is sliced
+#
+# usage
+#   import marc_file
+#   with marc_file.MarcFile('job1.h5') as mf:
+#       dtype_int, dtype_float = mf.dtypes
+#       disp = mf.node('Displacement')        # nothing read yet
+#       disp.shape                            # (nnode, ncomp, ninc)
+#       u = disp[:, 0:2, 10]                  # x/y of increment 10
+#       h = disp.by_id([10, 25, 300], inc=slice(0, 50))
+#       h = disp.history([10, 25, 300])      # ids in the mesh of each increment
+#       for i, mesh, rows, data in disp.stream():
+#           ...
+#       stress = mf.element('Stress')         # (nelem, nip, ncomp, ninc)
+#       s = stress[0:1000, :, 0, -1]
+# an h5py file that is already open (e.g. from staging.open_staging)
+# can be wrapped too, it is then not closed by MarcFile:
+#   mf = marc_file.MarcFile(hdf)
+#
+# Notes:
+# a view has the dataset axes without the trailing set, sub-increment,
+# real/imaginary and iteration axes: (row, comp, inc) for nodal results
+# and (row, ip, comp, inc) for element results. integer, slice and list
+# indices are accepted (list indices on one axis only, as in h5py); an
+# integer index drops the axis, as in numpy.
+# the hyperslabs keep the full rank of the dataset (see
+# marc_h5.node_sel), which is the fast transfer path on chunked data.
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+
+import id_index
+import marc_h5
+import mesh_stream
+
+
+def decode(value):
+    # attribute value as a python object: strings decoded, arrays of
+    # one value as a scalar
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace').rstrip('\x00')
+    if isinstance(value, np.ndarray):
+        if value.size == 1:
+            return decode(value.ravel()[0])
+        if value.dtype.kind == 'S':
+            return [decode(v) for v in value.ravel()]
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class MarcFile:
+
+    def __init__(self, file, mode='r'):
+        if isinstance(file, h5py.File):
+            self.hdf = file
+            self._own = False
+        else:
+            self.hdf = h5py.File(file, mode)
+            self._own = True
+        self.filename = self.hdf.filename
+        self._cache = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._own and self.hdf.id.valid:
+            self.hdf.close()
+        self._cache.clear()
+
+    def _cached(self, key, func, *args):
+        if key not in self._cache:
+            self._cache[key] = func(*args)
+        return self._cache[key]
+
+    # -----------------------------metadata
+    def attrs(self, path='/'):
+        # decoded attributes of a group or dataset
+        return self._cached(('attrs', path), lambda: {k: decode(v) for k, v in self.hdf[path].attrs.items()})
+
+    @property
+    def dtypes(self):
+        # (dtype_int, dtype_float) of the file precision
+        return self._cached('dtypes', marc_h5.file_dtypes, self.hdf)
+
+    @property
+    def precision(self):
+        return 'Single' if self.dtypes[1] == 'float32' else 'Double'
+
+    @property
+    def title(self):
+        return self.attrs(marc_h5.MARC).get('title')
+
+    @property
+    def summary(self):
+        # Summary compound as a dictionary of columns
+        def read():
+            s = self.hdf[marc_h5.SUMMARY][()]
+            return {c: s[marc_h5.summary_field(s.dtype, c)] for c in marc_h5.SUMMARY_COLUMNS}
+        return self._cached('summary', read)
+
+    def increment_times(self, ninc):
+        # increment number and total time of the first ninc increments
+        return self._cached(('times', ninc), marc_h5.increment_times, self.hdf, ninc)
+
+    def increment_meshes(self, ninc):
+        # mesh id active in each of the first ninc increments
+        return self._cached(('meshes', ninc), mesh_stream.increment_meshes, self.hdf, ninc)
+
+    def mesh_rows(self, kind):
+        # {mesh id: slice of valid rows} for 'node' or 'element'
+        return self._cached(('spans', kind), mesh_stream.mesh_rows, self.hdf, kind)
+
+    def index(self, kind):
+        # id index {mesh id: (sorted ids, rows)} (see id_index.py)
+        return self._cached(('index', kind), id_index.load_index, self.hdf, kind)
+
+    def ids(self, kind):
+        # external ids with shape (nrows, nmesh)
+        return self._cached(('ids', kind), id_index.read_ids, self.hdf, kind)
+
+    def rows(self, ids, kind='node', mesh=1, strict=True):
+        # array rows of node or element ids
+        return id_index.lookup(self.index(kind), ids, mesh, strict)
+
+    def increment_rows(self, ids, kind, ninc):
+        # [(slice of increments, mesh id, rows)] of node or element ids
+        # for every run of increments with the same mesh id (remeshing);
+        # the ids not in a mesh have the row -1
+        meshes = self.increment_meshes(ninc)
+        index = self.index(kind)
+        starts = [0] + (np.flatnonzero(np.diff(meshes)) + 1).tolist()
+        runs = []
+        for i0, i1 in zip(starts, starts[1:] + [ninc]):
+            mesh = int(meshes[i0])
+            rows = id_index.lookup(index, ids, mesh if mesh in index else 1, strict=False)
+            runs.append((slice(i0, i1), mesh, rows))
+        return runs
+
+    def post_summary(self, group=marc_h5.NODE):
+        # post summary of a result group
+        return self._cached(('post', group), lambda: self.hdf[group][marc_h5.post_summary_name(group)][()])
+
+    # -----------------------------results
+    def quantities(self, group=marc_h5.NODE):
+        # names of the result datasets of a group
+        def names():
+            if group not in self.hdf:
+                return []
+            skip = marc_h5.post_summary_name(group)
+            return [k for k, v in self.hdf[group].items() if k != skip and isinstance(v, h5py.Dataset)]
+        return self._cached(('names', group), names)
+
+    def node(self, name):
+        return ResultView(self, self.hdf[marc_h5.NODE + '/' + name])
+
+    def element(self, name):
+        return ResultView(self, self.hdf[marc_h5.ELEMENT + '/' + name])
+
+    def quantity(self, name):
+        # nodal result, or element result when there is no nodal one
+        if marc_h5.NODE + '/' + name in self.hdf:
+            return self.node(name)
+        if marc_h5.ELEMENT + '/' + name in self.hdf:
+            return self.element(name)
+        raise KeyError('quantity not found: %s' % name)
+
+    def __getitem__(self, name):
+        return self.quantity(name)
+
+
+class ResultView:
+    # array-like view of a nodal or element result; nothing is read
+    # until it is sliced
+
+    def __init__(self, mfile, dset):
+        self.file = mfile
+        self.dset = dset
+        self.element = dset.ndim == marc_h5.ELEMENT_NDIM
+        self.kind = 'element' if self.element else 'node'
+        # number of leading axes kept by the view
+        self._naxes = 4 if self.element else 3
+        self.shape = dset.shape[0:self._naxes]
+        self.dtype = dset.dtype
+
+    @property
+    def name(self):
+        return self.dset.name.rsplit('/', 1)[1]
+
+    @property
+    def ndim(self):
+        return self._naxes
+
+    @property
+    def ninc(self):
+        return self.shape[-1]
+
+    @property
+    def ncomp(self):
+        return self.shape[-2]
+
+    @property
+    def nip(self):
+        return self.shape[1] if self.element else 1
+
+    @property
+    def attrs(self):
+        return self.file.attrs(self.dset.name)
+
+    @property
+    def postcode(self):
+        return self.attrs.get('postcode')
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return '<%s result "%s" %s %s>' % (self.kind, self.name, self.shape, self.dtype)
+
+    def __array__(self, dtype=None):
+        data = self[()]
+        return data if dtype is None else data.astype(dtype)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) == 1 and key[0] is Ellipsis:
+            key = ()
+        if len(key) > self._naxes:
+            raise IndexError('too many indices for %s' % self)
+        key = key + (slice(None),) * (self._naxes - len(key))
+        sel, drop, fancy = [], [], None
+        for axis, k in enumerate(key):
+            n = self.shape[axis]
+            if isinstance(k, slice):
+                sel.append(k)
+            elif np.ndim(k) == 0:
+                k = int(k)
+                if k < -n or k >= n:
+                    raise IndexError('index %d out of range for axis %d with size %d' % (k, axis, n))
+                k = k % n
+                sel.append(slice(k, k + 1))
+                drop.append(axis)
+            else:
+                if fancy is not None:
+                    raise IndexError('list indices on one axis only')
+                k = np.asarray(k, dtype='i8') % n
+                # h5py needs increasing indices: read the unique sorted
+                # rows and restore the order afterwards
+                unique, inverse = np.unique(k, return_inverse=True)
+                sel.append(unique)
+                fancy = (axis, inverse)
+        sel = tuple(sel) + (slice(0, 1),) * (self.dset.ndim - self._naxes)
+        data = self.dset[sel]
+        data = data.reshape(data.shape[0:self._naxes])
+        if fancy is not None:
+            data = np.take(data, fancy[1], axis=fancy[0])
+        if drop:
+            data = data.reshape([s for a, s in enumerate(data.shape) if a not in drop])
+        return data
+
+    def by_id(self, ids, inc=slice(None), comp=slice(None), mesh=1):
+        # values of node (element) ids, with the rows from the id index;
+        # element results have all integration points
+        rows = self.file.rows(ids, self.kind, mesh)
+        if self.element:
+            return self[rows, :, comp, inc]
+        return self[rows, comp, inc]
+
+    def history(self, ids, comp=slice(None)):
+        # values of node (element) ids over all the increments, with the
+        # rows of the mesh id of each increment (remeshing); NaN in the
+        # increments whose mesh has not the id
+        out = np.full((len(ids),) + self.shape[1:], np.nan)[..., comp, :]
+        for incs, mesh, rows in self.file.increment_rows(ids, self.kind, self.ninc):
+            found = np.flatnonzero(rows >= 0)
+            if not found.size:
+                continue
+            if self.element:
+                out[found, ..., incs] = self[rows[found], :, comp, incs]
+            else:
+                out[found, ..., incs] = self[rows[found], comp, incs]
+        return out
+
+    def increment(self, i, comp=slice(None)):
+        # one increment, (nrow, ncomp) or (nrow, nip, ncomp)
+        if self.element:
+            return self[:, :, comp, i]
+        return self[:, comp, i]
+
+    def stream(self, incs=None, comp=slice(None)):
+        # (increment, mesh id, rows, data) over the increments, reading
+        # only the rows of the active mesh id (see mesh_stream.py)
+        return mesh_stream.stream(self.file.hdf, self.dset, incs, comp,
+                                  meshes=self.file.increment_meshes(self.ninc),
+                                  spans=self.file.mesh_rows(self.kind))
@@ -0,0 +1,283 @@
+# ---------------------------------------------------------------------
+# description
+# shared helpers for the h5 tools: precision detection, post summary
+# handling and creation of user-defined results in a Marc h5 file
+#
+# usage
+# import from another script placed in the same folder:
+#   import marc_h5
+#   dtype_int, dtype_float = marc_h5.file_dtypes(hdf)
+#
+# Notes:
+# the group and dataset names follow the xml template stored in the
+# mentat development folder:
+#     ...\source\marc\hdf\schema\Marc_2021.3.xml
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+
+# ---------------------------------------------------------------------
+# group and dataset names used by the h5 tools
+# ---------------------------------------------------------------------
+MARC = 'Marc'
+SUMMARY = 'Marc/Summary'
+ANALYSIS_DATA = 'Marc/Input/Analysis Data'
+CONNECTIVITY = 'Marc/Input/Element/Connectivity'
+NODE = 'Marc/Results/Node'
+ELEMENT = 'Marc/Results/Element'
+NODE_POST_SUMMARY = 'Node Post Summary'
+ELEMENT_POST_SUMMARY = 'Element Post Summary'
+# post code given to every user-defined result
+USER_POSTCODE = -1
+
+# ---------------------------------------------------------------------
+# columns of the "Summary" compound, in file order
+#   <dataset name="Summary" type="Compound">
+#     <column  0 name="INC"       type="integer"        description="Increment ID; -1 indicates end of analysis"/>
+#     ...
+#     <column 16 name="TITLE"     type="string"         description="Loadcase Title" length="70"/>
+# ---------------------------------------------------------------------
+SUMMARY_COLUMNS = ('INC', 'SUBINC', 'ITERTN', 'CASE', 'CYCL_INC', 'SEPA_INC', 'CUT_INC',
+                   'CYCL_TOT', 'SEPA_TOT', 'CUT_TOT', 'RMESH', 'DEACT', 'CONT_GEOM',
+                   'ANALFLAG', 'TIME_INC', 'TIME_TOT', 'TITLE')
+
+# ---------------------------------------------------------------------
+# layout of the result datasets
+#
+#  :  <dataset name="Nodal_Result_Quantity_Name" ndims="7 { -1,3,-1,-1,-1,2,-1}">
+#       <dim 0="Node List"/>
+#       <dim 1="Result Value" size="Ndim"/>
+#       <dim 2="Increment ID"/>
+#       <dim 3="Set ID"/>
+#       <dim 4="Sub-increment ID"/>
+#       <dim 5="Real-Imag Values"/>
+#       <dim 6="Iteration ID"/>
+#
+#  :  <dataset name="Element_Result_Quantity_Name" ndims="8 { -1,-1,-1,-1,-1,-1,2,-1}">
+#       <dim 0="Element List"/>
+#       <dim 1="Integration Point"/>
+#       <dim 2="Result Value" size="Ndim"/>
+#       <dim 3="Increment ID"/>
+#       <dim 4="Set ID"/>
+#       <dim 5="Sub-increment ID"/>
+#       <dim 6="Real-Imag Values"/>
+#       <dim 7="Iteration ID"/>
+#
+# the post summary datasets have one row per post code and the same
+# trailing dimensions as the nodal results:
+#   <column 0 description="Post Code"/>
+#   <column 2 description="Number of components"/>
+# ---------------------------------------------------------------------
+NODE_NDIM = 7
+ELEMENT_NDIM = 8
+# default number of elements read at a time when streaming
+ELEMENT_BLOCK = 65536
+
+# ---------------------------------------------------------------------
+# storage of the user results
+#
+# layouts:
+#   'increment' : one chunk holds many nodes/elements of one increment,
+#                 this is how Mentat reads results (one increment at a
+#                 time)
+#   'node'      : one chunk holds all increments of a few nodes/elements,
+#                 fast for time histories
+#   'contiguous': no chunks and no filters (old behaviour)
+# the shuffle filter and gzip compression are only possible with chunks
+# ---------------------------------------------------------------------
+STORAGE_LAYOUT = 'increment'
+COMPRESSION = 'gzip'
+COMPRESSION_OPTS = 4
+SHUFFLE = True
+# target size of one chunk in bytes
+CHUNK_BYTES = 1024 * 1024
+# number of nodes/elements in one chunk for the 'node' layout
+CHUNK_ENTITIES = 1024
+
+
+def file_dtypes(hdf):
+    # set data types based on the precision attribute of the "Marc"
+    # group:  0 = Single Precision, 1 = Double Precision
+    precision = hdf[MARC].attrs.get('precision')
+    if precision[0] == 0:
+        return 'i4', 'float32'
+    return 'i8', 'float64'
+
+
+def summary_field(dtype, column):
+    # name of a Summary column in the file compound type
+    # : the columns are found by position, so the tools do not depend
+    #   on the member names written by a given Marc version
+    return dtype.names[SUMMARY_COLUMNS.index(column)]
+
+
+def increment_times(hdf, ninc):
+    # increment number and total time of the first ninc increments
+    # read from the "Summary" compound (columns INC and TIME_TOT)
+    summary = hdf[SUMMARY]
+    n = min(ninc, summary.shape[0])
+    inc = np.arange(ninc)
+    time = np.full(ninc, np.nan)
+    inc[0:n] = summary.fields(summary_field(summary.dtype, 'INC'))[0:n]
+    time[0:n] = summary.fields(summary_field(summary.dtype, 'TIME_TOT'))[0:n]
+    return inc, time
+
+
+def parse_increments(text, ninc):
+    # increments from "first:last" or "i,j,k", all when empty
+    if not text:
+        return list(range(ninc))
+    if ':' in text:
+        first, last = text.split(':', 1)
+        return list(range(*slice(int(first or 0), int(last) if last else ninc).indices(ninc)))
+    incs = [int(v) for v in text.split(',') if v.strip()]
+    bad = [i for i in incs if i < 0 or i >= ninc]
+    if bad:
+        raise ValueError('increments out of range 0-%d: %s' % (ninc - 1, bad))
+    return incs
+
+
+def save_table(table, output):
+    # write a columnar table {name: 1-D array} as compressed npz or
+    # as csv
+    if output.lower().endswith('.csv'):
+        names = list(table)
+        with open(output, 'w') as fileo:
+            fileo.write(','.join('"%s"' % k for k in names) + '\n')
+            for row in zip(*[table[k] for k in names]):
+                fileo.write(','.join(str(v) for v in row) + '\n')
+    else:
+        np.savez_compressed(output, **table)
+
+
+def node_result_shape(nnode, ncomp, ninc):
+    # shape of a nodal result following the 7-D template layout
+    return (nnode, ncomp, ninc, 1, 1, 1, 1)
+
+
+def element_result_shape(nelem, nip, ncomp, ninc):
+    # shape of an element result following the 8-D template layout
+    return (nelem, nip, ncomp, ninc, 1, 1, 1, 1)
+
+
+def result_storage(shape, dtype_float, layout=None, compression=COMPRESSION,
+                   compression_opts=COMPRESSION_OPTS, shuffle=SHUFFLE):
+    # keyword arguments for create_dataset giving the chunk shape and
+    # the filters of a nodal (7-D) or element (8-D) result
+    layout = layout or STORAGE_LAYOUT
+    if layout == 'contiguous':
+        return {}
+    # position of the increment axis
+    inc_axis = 3 if len(shape) == ELEMENT_NDIM else 2
+    itemsize = np.dtype(dtype_float).itemsize
+    chunks = list(shape)
+    if layout == 'increment':
+        # all values of one entity in one increment...
+        chunks[inc_axis] = 1
+        row = itemsize * int(np.prod(chunks[1:]))
+        # ...for as many entities as fit in the chunk size
+        chunks[0] = max(1, min(shape[0], CHUNK_BYTES // row))
+    elif layout == 'node':
+        chunks[0] = max(1, min(shape[0], CHUNK_ENTITIES))
+    else:
+        raise ValueError('unknown storage layout: %s' % layout)
+    kwargs = {'chunks': tuple(chunks), 'shuffle': shuffle}
+    if compression:
+        kwargs['compression'] = compression
+        kwargs['compression_opts'] = compression_opts
+    return kwargs
+
+
+def _axis(index):
+    # integer index as a slice of length one
+    if isinstance(index, slice):
+        return index
+    return slice(index, index + 1)
+
+
+def node_sel(inc, rows=slice(None), comp=slice(None)):
+    # rank-preserving hyperslab of one increment of a nodal result
+    # : integer indices make h5py use a much slower transfer path on
+    #   chunked datasets (30x measured), so every axis is a slice and
+    #   the buffers keep the full 7-D rank
+    return (_axis(rows), _axis(comp), _axis(inc)) + (slice(0, 1),) * 4
+
+
+def element_sel(inc, rows=slice(None), ip=slice(None), comp=slice(None)):
+    # rank-preserving hyperslab of one increment of an element result
+    return (_axis(rows), _axis(ip), _axis(comp), _axis(inc)) + (slice(0, 1),) * 4
+
+
+def post_summary_name(group):
+    # name of the post summary dataset belonging to a result group
+    if group.rstrip('/').endswith('Element'):
+        return ELEMENT_POST_SUMMARY
+    return NODE_POST_SUMMARY
+
+
+def is_user_result(dset):
+    # a user result is a dataset with a "-1" postcode attribute
+    if not isinstance(dset, h5py.Dataset):
+        return False
+    postcode = dset.attrs.get('postcode')
+    return postcode is not None and int(np.ravel(postcode)[0]) == USER_POSTCODE
+
+
+def create_user_result(hdf, group, label, shape, dtype_float, dtype_int, layout=None, **kwargs):
+    # create an empty user-defined result dataset in the given result
+    # group; an old dataset with the same label is deleted first.
+    # the chunks and filters are given by the storage layout, extra
+    # keyword arguments are passed to h5py create_dataset
+    path = group + '/' + label
+    if path in hdf:
+        del hdf[path]
+        print('\n  Old user result deleted...' + label)
+    storage = result_storage(shape, dtype_float, layout)
+    storage.update(kwargs)
+    dset = hdf.create_dataset(path, shape=shape, dtype=dtype_float, **storage)
+    dset.attrs.create('postcode', [USER_POSTCODE], dtype=dtype_int)
+    # create a typed null-terminated fixed-length string (C_S1)
+    # : changing user_post_label to anything other than
+    #   'user_post_label' will crash Mentat when trying to access
+    #   results
+    tid = h5py.h5t.TypeID.copy(h5py.h5t.C_S1)
+    tid.set_size(len(label))
+    dset.attrs.create('user_post_label', label, None, tid)
+    print('\n  New user result created...' + label)
+    return dset
+
+
+def sync_post_summary(hdf, group, dtype_int):
+    # rebuild the post summary of a result group so that it holds
+    # exactly one "-1" row per user result dataset in the group.
+    # this replaces the old "append only if no -1 found" check, which
+    # could not handle more than one user result per group
+    g = hdf[group]
+    name = post_summary_name(group)
+    summary = g[name][()]
+    ninc = summary.shape[2]
+    # keep the solver post codes
+    keep = summary[:, 0, 0, 0, 0, 0, 0] != USER_POSTCODE
+    rows = [summary[keep]]
+    # one row for each user result in the group (in group order)
+    for label in g:
+        dset = g[label]
+        if label == name or not is_user_result(dset):
+            continue
+        user_postcode = np.zeros((1,) + summary.shape[1:], dtype=summary.dtype)
+        user_postcode[0, 0, 0:ninc, 0, 0, 0, 0] = USER_POSTCODE
+        # number of components is the "Result Value" dimension
+        ncomp = dset.shape[2] if dset.ndim == ELEMENT_NDIM else dset.shape[1]
+        user_postcode[0, 2, 0:ninc, 0, 0, 0, 0] = ncomp
+        rows.append(user_postcode)
+    summary = np.concatenate(rows, axis=0)
+    # delete old post summary and write the updated one
+    del g[name]
+    g.create_dataset(name, dtype=dtype_int, data=summary)
+    return summary
+
+
+def element_blocks(nelem, block=ELEMENT_BLOCK, start=0):
+    # generator over (first, last) element rows in blocks
+    for e0 in range(start, nelem, block):
+        yield e0, min(e0 + block, nelem)
@@ -0,0 +1,109 @@
+# ---------------------------------------------------------------------
+# description
+# remeshing-aware streaming over the increments of a Marc h5 result
+#
+# the result arrays are sized to the maximum number of nodes (elements)
+# over all mesh ids, so after a remeshing/rezoning most increments only
+# use part of the rows. stream() yields, for each increment, only the
+# rows that belong to the mesh id active in that increment, so the
+# derived-result and export tools do not read or compute dead rows.
+#
+# usage
+#   import mesh_stream
+#   dset = hdf['Marc/Results/Node/Displacement']
+#   for inc, mesh, rows, data in mesh_stream.stream(hdf, dset):
+#       # data has shape (n, ncomp) for nodal results and
+#       # (n, nip, ncomp) for element results, for the rows rows
+#       ...
+#
+# Notes:
+# the mesh id of each increment is the RMESH column of "Summary".
+# the rows of a mesh id come from the id index (see id_index.py) when
+# the file has id datasets, otherwise from "Analysis Data", which gives
+# the number of nodes (row 1) and elements (row 2) for each mesh id
+# (third dimension).
+# the rows are returned as one slice from the first to the last valid
+# row of the mesh id.
+# data is a view of a buffer that is reused for the next increment:
+# copy it if it has to be kept.
+# ---------------------------------------------------------------------
+import numpy as np
+
+import id_index
+import marc_h5
+
+
+def increment_meshes(hdf, ninc):
+    # mesh id active in each of the first ninc increments
+    mesh = np.ones(ninc, dtype='i8')
+    if marc_h5.SUMMARY in hdf:
+        summary = hdf[marc_h5.SUMMARY]
+        n = min(ninc, summary.shape[0])
+        mesh[0:n] = summary.fields(marc_h5.summary_field(summary.dtype, 'RMESH'))[0:n]
+    # mesh id 0 is written for analyses without remeshing
+    mesh[mesh < 1] = 1
+    return mesh
+
+
+def mesh_rows(hdf, kind):
+    # dictionary {mesh id: slice of valid rows}
+    path = id_index.NODE_IDS if kind == 'node' else id_index.ELEMENT_IDS
+    if path in hdf:
+        spans = {}
+        for m, (ids, rows) in id_index.load_index(hdf, kind).items():
+            if len(rows):
+                spans[m] = slice(int(rows.min()), int(rows.max()) + 1)
+            else:
+                spans[m] = slice(0, 0)
+        return spans
+    spans = {}
+    if marc_h5.ANALYSIS_DATA in hdf:
+        gs = hdf[marc_h5.ANALYSIS_DATA][()]
+        # row 1 = # nodes, row 2 = # elements
+        stat = 1 if kind == 'node' else 2
+        for m in range(gs.shape[2]):
+            if gs[stat, 0, m] > 0:
+                spans[m + 1] = slice(0, int(gs[stat, 0, m]))
+    return spans
+
+
+def stream(hdf, dset, incs=None, comp=slice(None), meshes=None, spans=None):
+    # generator over (increment, mesh id, rows, data) of a nodal or
+    # element result dataset, reading only the valid rows
+    # : meshes and spans (from increment_meshes and mesh_rows) can be
+    #   given by a caller that has them already (see marc_file.py)
+    element = dset.ndim == marc_h5.ELEMENT_NDIM
+    inc_axis = 3 if element else 2
+    ninc = dset.shape[inc_axis]
+    nmax = dset.shape[0]
+    if incs is None:
+        incs = range(ninc)
+    if meshes is None:
+        meshes = increment_meshes(hdf, ninc)
+    if spans is None:
+        spans = mesh_rows(hdf, 'element' if element else 'node')
+    # reusable buffer for the largest mesh
+    comp = comp if isinstance(comp, slice) else slice(comp, comp + 1)
+    ncomp = len(range(*comp.indices(dset.shape[inc_axis - 1])))
+    if element:
+        buf = np.empty(marc_h5.element_result_shape(nmax, dset.shape[1], ncomp, 1), dtype=dset.dtype)
+    else:
+        buf = np.empty(marc_h5.node_result_shape(nmax, ncomp, 1), dtype=dset.dtype)
+    #
+    # -----------------------------loop over increments
+    for i in incs:
+        mesh = int(meshes[i])
+        span = spans.get(mesh, slice(0, nmax))
+        rows = slice(min(span.start, nmax), min(span.stop, nmax))
+        n = rows.stop - rows.start
+        if n > 0:
+            if element:
+                sel = marc_h5.element_sel(i, rows, comp=comp)
+            else:
+                sel = marc_h5.node_sel(i, rows, comp=comp)
+            dset.read_direct(buf, sel, np.s_[0:n])
+        if element:
+            data = buf[0:n, :, :, 0, 0, 0, 0, 0]
+        else:
+            data = buf[0:n, :, 0, 0, 0, 0, 0]
+        yield i, mesh, rows, data
@@ -0,0 +1,169 @@
+# ---------------------------------------------------------------------
+# description
+# script to compute a derived result on several cores: the increments
+# are split in ranges, every worker process reads its own slab of the
+# h5 file and puts the derived values in a shared memory block, and
+# the main process is the only one writing to h5
+#
+# derived results available (over the components of the quantity):
+#   resultant : sqrt(x*x + y*y) of the first two components
+#   magnitude : norm of all components
+#   max_abs   : largest absolute component
+#
+# usage
+# open CMD shell in same folder as h5 file and then type:
+#   python parallel_results.py job1.h5 Displacement magnitude
+# optional arguments are the number of workers (default: number of
+# cpus) and the number of increments per task (default 4):
+#   python parallel_results.py job1.h5 Displacement resultant 8 2
+#
+# Notes:
+# nodal (Marc/Results/Node) and element (Marc/Results/Element)
+# quantities are accepted, the result is written in the same group as
+# "<quantity> <derived>".
+# the result file is read-only while the workers run, the result is
+# written to the staging file and published at the end (see
+# staging.py).
+# at most two tasks per worker are in flight, so the shared memory used
+# is bounded by 2 x workers x increments per task x one increment.
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+
+import marc_file
+import marc_h5
+import mesh_stream
+import staging
+
+
+def resultant(data, out):
+    np.hypot(data[..., 0], data[..., 1], out=out)
+
+
+def magnitude(data, out):
+    np.sqrt(np.einsum('...i,...i->...', data, data), out=out)
+
+
+def max_abs(data, out):
+    np.max(np.abs(data), axis=-1, out=out)
+
+
+DERIVED = {'resultant': resultant, 'magnitude': magnitude, 'max_abs': max_abs}
+
+
+def worker(filename, quantity, derived, incs, shm_name, shape, dtype):
+    # compute the derived result for the increments incs into the
+    # shared memory block (result layout with len(incs) increments);
+    # returns the valid rows of each increment
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        valid = []
+        with h5py.File(filename, 'r') as hdf:
+            dset = hdf[quantity]
+            for k, (i, mesh, rows, data) in enumerate(mesh_stream.stream(hdf, dset, incs)):
+                n = rows.stop - rows.start
+                if len(shape) == marc_h5.ELEMENT_NDIM:
+                    DERIVED[derived](data, out[0:n, :, 0, k, 0, 0, 0, 0])
+                else:
+                    DERIVED[derived](data, out[0:n, 0, k, 0, 0, 0, 0])
+                valid.append((i, rows.start, rows.stop))
+        del out
+    finally:
+        shm.close()
+    return valid
+
+
+def parallel_results(filename, quantity, derived, workers=None, incs_per_task=4):
+    if derived not in DERIVED:
+        raise ValueError('unknown derived result: %s' % derived)
+    workers = workers or os.cpu_count() or 1
+    with staging.open_staging(filename) as (hdf, stg):
+        mf = marc_file.MarcFile(hdf)
+        dtype_int, dtype_float = mf.dtypes
+        # quantity searched in the node group, then the element group
+        src = mf.quantity(quantity)
+        element = src.element
+        group = marc_h5.ELEMENT if element else marc_h5.NODE
+        path = src.dset.name
+        nrow, ninc = len(src), src.ninc
+        if element:
+            shape = marc_h5.element_result_shape(nrow, src.nip, 1, ninc)
+        else:
+            shape = marc_h5.node_result_shape(nrow, 1, ninc)
+        label = '%s %s' % (quantity, derived)
+        out = marc_h5.create_user_result(stg, group, label, shape, dtype_float, dtype_int)
+        print('  # Increments:\t', ninc - 1)
+        print('  # Workers:\t', workers)
+        # build the id index once here, so that the workers only read it
+        # (see id_index.py)
+        mf.mesh_rows(src.kind)
+        # the source is read by the workers only
+        tasks = [range(i, min(i + incs_per_task, ninc)) for i in range(0, ninc, incs_per_task)]
+        itemsize = np.dtype(dtype_float).itemsize
+        pending = {}
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                while tasks or pending:
+                    # keep at most two tasks per worker in flight
+                    while tasks and len(pending) < 2 * workers:
+                        incs = tasks.pop(0)
+                        # shared block with the result layout for the
+                        # increments of the task
+                        if element:
+                            tshape = marc_h5.element_result_shape(nrow, src.nip, 1, len(incs))
+                        else:
+                            tshape = marc_h5.node_result_shape(nrow, 1, len(incs))
+                        shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(tshape)) * itemsize))
+                        fut = pool.submit(worker, filename, path, derived, incs, shm.name, tshape, dtype_float)
+                        pending[fut] = (shm, tshape)
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        shm, tshape = pending.pop(fut)
+                        try:
+                            valid = fut.result()
+                            res = np.ndarray(tshape, dtype=dtype_float, buffer=shm.buf)
+                            # single writer: only this process writes to h5
+                            for k, (i, r0, r1) in enumerate(valid):
+                                if element:
+                                    sel = marc_h5.element_sel(k, slice(0, r1 - r0))
+                                    dest = marc_h5.element_sel(i, slice(r0, r1))
+                                else:
+                                    sel = marc_h5.node_sel(k, slice(0, r1 - r0))
+                                    dest = marc_h5.node_sel(i, slice(r0, r1))
+                                out.write_direct(res, sel, dest)
+                            del res
+                        finally:
+                            shm.close()
+                            shm.unlink()
+        finally:
+            # shared blocks of tasks not collected after an error
+            for shm, tshape in pending.values():
+                shm.close()
+                shm.unlink()
+    staging.publish(filename)
+
+
+def main():
+    print('\n HDF5 Parallel Results Processing')
+    print(' --------------------------------\n')
+    if len(sys.argv) > 3:
+        file, quantity, derived = sys.argv[1:4]
+    else:
+        file = input("Enter HDF5 file : ")
+        quantity = input("Enter quantity : ")
+        derived = input("Enter derived result (%s) : " % ', '.join(DERIVED))
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    incs_per_task = int(sys.argv[5]) if len(sys.argv) > 5 else 4
+    print(' HDF5 file being used: ', file)
+    parallel_results(file, quantity, derived, workers, incs_per_task)
+    print('\n HDF5 Parallel Results Processing End')
+    print(' ------------------------------------\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# ---------------------------------------------------------------------
+# description
+# script to extract the time histories of a few nodes or elements
+# (a probe set) from many h5 result files, e.g. all jobs of a DOE, and
+# to stack them in one columnar table
+#
+# usage
+# open CMD shell in the folder with the h5 files and then type:
+#   python probe_history.py -n 10,25,300 -q Displacement job*.h5
+#   python probe_history.py -e 7,8 -q "Equivalent Von Mises Stress" -o probes.csv doe_*.h5
+# options:
+#   -n  node ids (comma separated) for the nodal quantities
+#   -e  element ids (comma separated) for the element quantities
+#   -q  quantity names (comma separated), searched in the Node group
+#       with -n and in the Element group with -e
+#   -o  output file, .npz (default probes.npz) or .csv
+#   -w  number of worker processes (default: number of cpus)
+#
+# Notes:
+# every file is read by a separate process. only the hyperslabs of the
+# requested rows are read, never a full dataset.
+# element quantities are averaged over the integration points.
+# the table has one row per file, id and increment with the columns
+#   job (file name), kind (node or element), id, increment, time,
+#   <quantity> <component> ...
+# after a remeshing the ids are looked up in the mesh of each increment;
+# the ids not found in a mesh are listed for that file and are NaN in
+# the increments of that mesh (left out when found in no mesh), the
+# other files are extracted as usual.
+# ---------------------------------------------------------------------
+import numpy as np
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import marc_file
+import marc_h5
+
+
+def read_file(path, node_ids, elem_ids, quantities):
+    # column blocks for one h5 file, one block for the nodes and one
+    # for the elements, and the (kind, mesh id, ids) not found in a mesh
+    blocks = []
+    missing = []
+    with marc_file.MarcFile(path) as mf:
+        probes = []
+        if node_ids:
+            probes.append((marc_h5.NODE, 'node', node_ids))
+        if elem_ids:
+            probes.append((marc_h5.ELEMENT, 'element', elem_ids))
+        for group, kind, ids in probes:
+            names = [q for q in quantities if group + '/' + q in mf.hdf]
+            if not names:
+                continue
+            view = mf.node(names[0]) if kind == 'node' else mf.element(names[0])
+            ninc = view.ninc
+            # the ids are looked up in the mesh of every increment
+            # (remeshing); an id missing in a mesh is NaN in its
+            # increments, an id missing in all the meshes is left out
+            found = np.zeros(len(ids), dtype=bool)
+            for incs, mesh, rows in mf.increment_rows(ids, kind, ninc):
+                found |= rows >= 0
+                if not (rows >= 0).all():
+                    missing.append((kind, mesh, [i for i, r in zip(ids, rows) if r < 0]))
+            ids = [i for i, f in zip(ids, found) if f]
+            if not ids:
+                continue
+            block = {}
+            for q in names:
+                # only the hyperslabs of the requested rows are read,
+                # the rows come from the id index (see marc_file.py)
+                view = mf.node(q) if kind == 'node' else mf.element(q)
+                data = view.history(ids)
+                if view.element:
+                    # average of the integration points
+                    data = data.mean(axis=1)
+                # (nid, ninc, ncomp)
+                data = np.transpose(data, (0, 2, 1))
+                for c in range(data.shape[2]):
+                    label = q if data.shape[2] == 1 else '%s %d' % (q, c + 1)
+                    block[label] = data[:, :, c].ravel()
+            inc, time = mf.increment_times(ninc)
+            nid = len(ids)
+            block['id'] = np.repeat(np.asarray(ids, dtype='i8'), ninc)
+            block['increment'] = np.tile(inc, nid)
+            block['time'] = np.tile(time, nid)
+            block['job'] = np.full(nid * ninc, os.path.basename(path))
+            block['kind'] = np.full(nid * ninc, kind)
+            blocks.append(block)
+    return blocks, missing
+
+
+def extract(files, node_ids=None, elem_ids=None, quantities=(), workers=None):
+    # read all files in parallel and stack the columns in file order;
+    # a quantity missing in a file is filled with NaN, the ids missing
+    # in a file are printed
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(read_file, files, [node_ids] * len(files),
+                                [elem_ids] * len(files), [list(quantities)] * len(files)))
+    parts = []
+    for path, (blocks, missing) in zip(files, results):
+        parts += blocks
+        for kind, mesh, ids in missing:
+            print('  %s: %s ids not found in mesh %d: %s'
+                  % (path, kind, mesh, ', '.join(str(i) for i in ids)))
+    names = ['job', 'kind', 'id', 'increment', 'time']
+    for part in parts:
+        names += [k for k in part if k not in names]
+    table = {}
+    for k in names:
+        cols = []
+        for part in parts:
+            n = len(part['id'])
+            cols.append(part[k] if k in part else np.full(n, np.nan))
+        table[k] = np.concatenate(cols) if cols else np.array([])
+    return table
+
+
+def parse_ids(text):
+    return [int(v) for v in text.split(',') if v.strip()] if text else None
+
+
+def main():
+    print('\n HDF5 Probe History Extraction')
+    print(' -----------------------------\n')
+    parser = argparse.ArgumentParser(description='probe histories from many h5 files')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('-n', dest='nodes', default='')
+    parser.add_argument('-e', dest='elements', default='')
+    parser.add_argument('-q', dest='quantities', default='Displacement')
+    parser.add_argument('-o', dest='output', default='probes.npz')
+    parser.add_argument('-w', dest='workers', type=int, default=None)
+    args = parser.parse_args()
+    # expand wildcards (not done by the windows CMD shell)
+    files = []
+    for f in args.files:
+        files += sorted(glob.glob(f)) or [f]
+    quantities = [q.strip() for q in args.quantities.split(',') if q.strip()]
+    node_ids = parse_ids(args.nodes)
+    elem_ids = parse_ids(args.elements)
+    if not node_ids and not elem_ids:
+        print(' no node (-n) or element (-e) ids given')
+        sys.exit(1)
+    print(' # Files:\t', len(files))
+    print(' Quantities:\t', quantities)
+    table = extract(files, node_ids, elem_ids, quantities, args.workers)
+    marc_h5.save_table(table, args.output)
+    print(' # Rows:\t', len(table['id']))
+    print(' Table written:\t', args.output)
+    print('\n HDF5 Probe History Extraction End')
+    print(' ---------------------------------\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# ---------------------------------------------------------------------
+# description
+# write path for user results that does not keep the h5 result file
+# locked while the derived results are computed
+#
+# opening the result file in (a)ppend mode for the whole run blocks
+# Mentat and any other reader, and a crash leaves the status_flags of
+# the superblock set (see the h5clear note in h5py_marc.py). here the
+# result file is only opened read-only during the computation, the
+# user results are written to a staging file next to it, and then
+# published with a short critical section: the result file is opened
+# in append mode only to copy the finished datasets and to update the
+# post summaries.
+#
+# usage
+#   import staging
+#   with staging.open_staging(file) as (hdf, stg):
+#       ... read from hdf, create the user results in stg ...
+#   staging.publish(file)
+# a staging file left by a crashed run can be published by hand:
+#   python staging.py job1.h5
+#
+# Notes:
+# the copy uses H5Ocopy (h5py Group.copy), which copies the chunks as
+# they are (no decompression) together with the attributes.
+# publish copies the datasets into a group outside the results
+# (PUBLISH_GROUP) and then moves them into the result groups and
+# rebuilds the post summaries, so a crash during the copy leaves the
+# results as they were (the copies are deleted by the next publish and
+# the staging file is kept to publish again). what is left is the short
+# window of the moves and the post summary update, metadata only: a
+# crash there can leave a user result without its post summary row,
+# found and repaired by check_h5.py --repair. HDF5 without SWMR has no
+# concurrent reader of a file open for writing: the readers wait for
+# the file lock (see open_append).
+# SWMR append is not used because the Marc result files are not written
+# with the latest file format that SWMR needs.
+# ---------------------------------------------------------------------
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import h5py
+
+import check_h5
+import marc_h5
+
+RESULT_GROUPS = (marc_h5.NODE, marc_h5.ELEMENT)
+# group of the result file holding the copied datasets until they are
+# moved into the result groups
+PUBLISH_GROUP = '_publish'
+
+
+def staging_path(filename):
+    # name of the staging file next to the h5 file
+    return filename + '.staging.h5'
+
+
+@contextmanager
+def open_staging(filename, check=True, repair=False):
+    # open the result file read-only and a new staging file with the
+    # same result groups and precision attribute; the staging file is
+    # deleted if the computation fails, so that a partial result is
+    # never published
+    # : with check the file is checked first (see check_h5.py), so that
+    #   a damaged file stops the run before the computation starts
+    # : with repair what can be repaired is repaired by the check
+    if check:
+        check_h5.precheck(filename, repair=repair, staging=False)
+    path = staging_path(filename)
+    try:
+        with h5py.File(filename, 'r') as hdf:
+            with h5py.File(path, 'w') as stg:
+                stg.require_group(marc_h5.MARC)
+                stg[marc_h5.MARC].attrs['precision'] = hdf[marc_h5.MARC].attrs.get('precision')
+                for group in RESULT_GROUPS:
+                    if group in hdf:
+                        stg.require_group(group)
+                yield hdf, stg
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def open_append(filename, retries=30, wait=1.0):
+    # open the result file in append mode, waiting while another
+    # program holds the file lock
+    for attempt in range(retries):
+        try:
+            return h5py.File(filename, 'a')
+        except OSError:
+            if attempt == retries - 1:
+                raise
+            print('  file locked, waiting...', filename)
+            time.sleep(wait)
+
+
+def publish(filename, retries=30, wait=1.0):
+    # copy the user results of the staging file into the result file
+    # and update the post summaries; returns the published datasets
+    path = staging_path(filename)
+    if not os.path.exists(path):
+        return []
+    published = []
+    with h5py.File(path, 'r') as stg:
+        # critical section: the result file is open in append mode
+        # only for the copy
+        with open_append(filename, retries, wait) as hdf:
+            dtype_int, dtype_float = marc_h5.file_dtypes(hdf)
+            # datasets copied by a publish that did not finish
+            if PUBLISH_GROUP in hdf:
+                del hdf[PUBLISH_GROUP]
+            # 1. copy the datasets outside the result groups, where no
+            #    reader looks for results
+            moves = []
+            for k, group in enumerate(RESULT_GROUPS):
+                if group not in stg or group not in hdf:
+                    continue
+                labels = [x for x in stg[group] if marc_h5.is_user_result(stg[group][x])]
+                if not labels:
+                    continue
+                tmp = hdf.require_group('%s/%d' % (PUBLISH_GROUP, k))
+                for label in labels:
+                    hdf.copy(stg[group][label], tmp, name=label)
+                    moves.append((group, label, tmp.name + '/' + label))
+            # 2. move them into the result groups (links only, no data
+            #    is copied) and register them in the post summaries
+            for group, label, name in moves:
+                if label in hdf[group]:
+                    del hdf[group][label]
+                hdf.move(name, group + '/' + label)
+                published.append(group + '/' + label)
+            for group in dict.fromkeys(g for g, label, name in moves):
+                marc_h5.sync_post_summary(hdf, group, dtype_int)
+            if PUBLISH_GROUP in hdf:
+                del hdf[PUBLISH_GROUP]
+    os.remove(path)
+    for name in published:
+        print('  Published...', name)
+    return published
+
+
+def main():
+    # publish a staging file left by an earlier run
+    if len(sys.argv) > 1:
+        file = sys.argv[1]
+    else:
+        file = input("Enter HDF5 file : ")
+    if not os.path.exists(staging_path(file)):
+        print(' No staging file for', file)
+        return
+    publish(file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# ---------------------------------------------------------------------
+# description
+# run-health report of a Marc job straight from the "Summary" compound
+# of the h5 result file, without the .out file:
+#   - per loadcase: # increments, cycles, cutbacks, separations, time
+#   - histogram of the time steps
+#   - slowest increments (most cycles)
+#
+# usage
+# open CMD shell in same folder as h5 file and then type:
+#   python summary_stats.py job1.h5
+# optional arguments are the output file (.npz or .csv, default
+# <job>_summary.npz) and the number of slowest increments (default 10):
+#   python summary_stats.py job1.h5 job1_summary.csv 20
+#
+# Notes:
+# the Summary compound is read once and all statistics are computed
+# with numpy, there is no python loop over the increments.
+# the output file holds the per-increment columns; with .csv a second
+# file <output>_loadcase.csv holds the per-loadcase table.
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+import os
+import sys
+
+import marc_h5
+
+
+def read_summary(hdf):
+    # Summary columns as a dictionary of 1-D arrays, without the
+    # end-of-analysis row (INC = -1)
+    s = hdf[marc_h5.SUMMARY][()]
+    columns = {}
+    for c in marc_h5.SUMMARY_COLUMNS:
+        if c != 'TITLE':
+            columns[c] = s[marc_h5.summary_field(s.dtype, c)]
+    valid = columns['INC'] >= 0
+    return {k: v[valid] for k, v in columns.items()}
+
+
+def loadcase_table(columns):
+    # totals per loadcase with bincount over the loadcase index
+    cases, idx = np.unique(columns['CASE'], return_inverse=True)
+    n = len(cases)
+    table = {
+        'CASE': cases,
+        'INCREMENTS': np.bincount(idx, minlength=n),
+        'CYCLES': np.bincount(idx, weights=columns['CYCL_INC'], minlength=n).astype('i8'),
+        'CUTBACKS': np.bincount(idx, weights=columns['CUT_INC'], minlength=n).astype('i8'),
+        'SEPARATIONS': np.bincount(idx, weights=columns['SEPA_INC'], minlength=n).astype('i8'),
+        'TIME': np.bincount(idx, weights=columns['TIME_INC'], minlength=n),
+    }
+    table['CYCLES_PER_INC'] = table['CYCLES'] / np.maximum(table['INCREMENTS'], 1)
+    return table
+
+
+def timestep_histogram(columns, nbins=10):
+    # histogram of the positive time steps on logarithmic bins
+    dt = columns['TIME_INC']
+    dt = dt[dt > 0]
+    if len(dt) == 0:
+        return np.zeros(0, dtype='i8'), np.zeros(0)
+    lo, hi = np.log10(dt.min()), np.log10(dt.max())
+    if hi - lo < 1.0e-12:
+        hi = lo + 1.0
+    return np.histogram(dt, bins=np.logspace(lo, hi, nbins + 1))
+
+
+def slowest_increments(columns, nslow=10):
+    # increments with the most cycles (cutbacks first on ties)
+    order = np.lexsort((-columns['CUT_INC'], -columns['CYCL_INC']))
+    return order[0:nslow]
+
+
+def main():
+    print('\n HDF5 Summary Statistics')
+    print(' -----------------------\n')
+    if len(sys.argv) > 1:
+        file = sys.argv[1]
+    else:
+        file = input("Enter HDF5 file : ")
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(file)[0] + '_summary.npz'
+    nslow = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    print(' HDF5 file being used: ', file)
+    with h5py.File(file, 'r') as hdf:
+        columns = read_summary(hdf)
+    ninc = len(columns['INC'])
+    print('\n Number of increments: ', ninc)
+    print(' Total cycles:\t\t', int(columns['CYCL_INC'].sum()))
+    print(' Total cutbacks:\t', int(columns['CUT_INC'].sum()))
+    print(' Total separations:\t', int(columns['SEPA_INC'].sum()))
+    #
+    # -----------------------------loadcases
+    lc = loadcase_table(columns)
+    print('\n Loadcases:')
+    print('   %6s %8s %8s %8s %8s %10s %12s' % ('Case', '# Inc', 'Cycles', 'Cutbacks',
+                                                'Separ.', 'Cyc/Inc', 'Time'))
+    for i in range(len(lc['CASE'])):
+        print('   %6d %8d %8d %8d %8d %10.2f %12.6g' % (
+            lc['CASE'][i], lc['INCREMENTS'][i], lc['CYCLES'][i], lc['CUTBACKS'][i],
+            lc['SEPARATIONS'][i], lc['CYCLES_PER_INC'][i], lc['TIME'][i]))
+    #
+    # -----------------------------time steps
+    counts, edges = timestep_histogram(columns)
+    print('\n Time step histogram:')
+    for i in range(len(counts)):
+        print('   %12.4g - %12.4g : %d' % (edges[i], edges[i + 1], counts[i]))
+    #
+    # -----------------------------slowest increments
+    print('\n Slowest increments:')
+    for k in slowest_increments(columns, nslow):
+        print('   Inc: %6d  Case: %4d  Cycles: %4d  Cutbacks: %3d  Time step: %.6g' % (
+            columns['INC'][k], columns['CASE'][k], columns['CYCL_INC'][k],
+            columns['CUT_INC'][k], columns['TIME_INC'][k]))
+    #
+    # -----------------------------export
+    if output.lower().endswith('.csv'):
+        marc_h5.save_table(columns, output)
+        marc_h5.save_table(lc, os.path.splitext(output)[0] + '_loadcase.csv')
+    else:
+        table = dict(columns)
+        for k, v in lc.items():
+            table['loadcase_' + k] = v
+        table['timestep_counts'] = counts
+        table['timestep_edges'] = edges
+        marc_h5.save_table(table, output)
+    print('\n Statistics written: ', output)
+    print('\n HDF5 Summary Statistics End')
+    print(' ---------------------------\n')
+
+
+if __name__ == '__main__':
+    main()
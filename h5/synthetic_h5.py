@@ -0,0 +1,150 @@
+# ---------------------------------------------------------------------
+# description
+# script to generate a synthetic h5 file with the Marc result schema,
+# used to test and benchmark the h5 tools without a Marc run:
+#   - Marc group with the precision and title attributes
+#   - Summary compound (one row per increment plus the -1 end row)
+#   - Input/Analysis Data, Input/Element/Connectivity, Node ID and
+#     Element ID
+#   - Results/Node/Displacement with the 7-D layout and the
+#     Node Post Summary
+#   - Results/Element/Stress with the 8-D layout and the
+#     Element Post Summary
+#
+# usage
+# open CMD shell in this folder and then type:
+#   python synthetic_h5.py synthetic.h5
+# optional arguments are the number of nodes, the number of increments
+# and the precision (0 single, 1 double; default 10000 10 1):
+#   python synthetic_h5.py synthetic.h5 1000000 50 0
+#
+# Notes:
+# the mesh is a row of hexahedra (4 nodes per layer), the values are
+# smooth functions of the node/element position and of the increment.
+# the results are written one increment at a time.
+# ---------------------------------------------------------------------
+import numpy as np
+import h5py
+import sys
+
+import marc_h5
+
+# integration points and components of the element result
+NIP = 8
+NCOMP_ELEMENT = 6
+
+SUMMARY_DTYPE = np.dtype([
+    ('INC', 'i4'), ('SUBINC', 'i4'), ('ITERTN', 'i4'), ('CASE', 'i4'),
+    ('CYCL_INC', 'i4'), ('SEPA_INC', 'i4'), ('CUT_INC', 'i4'),
+    ('CYCL_TOT', 'i4'), ('SEPA_TOT', 'i4'), ('CUT_TOT', 'i4'),
+    ('RMESH', 'i4'), ('DEACT', 'i4'), ('CONT_GEOM', 'i4'), ('ANALFLAG', 'i4'),
+    ('TIME_INC', 'f8'), ('TIME_TOT', 'f8'), ('TITLE', 'S70')])
+
+
+def summary_table(ninc, seed=0):
+    # Summary compound with ninc increments and the -1 end row
+    rng = np.random.default_rng(seed)
+    s = np.zeros(ninc + 1, dtype=SUMMARY_DTYPE)
+    s['INC'][0:ninc] = np.arange(ninc)
+    s['INC'][ninc] = -1
+    s['CASE'][0:ninc] = 1 + np.arange(ninc) * 2 // max(ninc, 1)
+    s['CYCL_INC'][1:ninc] = rng.integers(1, 8, ninc - 1)
+    s['CUT_INC'][1:ninc] = rng.random(ninc - 1) < 0.05
+    s['SEPA_INC'][1:ninc] = rng.random(ninc - 1) < 0.1
+    s['CYCL_TOT'] = np.cumsum(s['CYCL_INC'])
+    s['CUT_TOT'] = np.cumsum(s['CUT_INC'])
+    s['SEPA_TOT'] = np.cumsum(s['SEPA_INC'])
+    s['RMESH'] = 1
+    s['TIME_INC'][1:ninc] = 1.0 / max(ninc - 1, 1) / (1 + s['CUT_INC'][1:ninc])
+    s['TIME_TOT'][0:ninc] = np.cumsum(s['TIME_INC'][0:ninc])
+    s['TIME_TOT'][ninc] = s['TIME_TOT'][ninc - 1]
+    s['TITLE'] = b'synthetic'
+    return s
+
+
+def post_summary(postcode, ncomp, ninc, dtype_int):
+    # post summary with one post code
+    ps = np.zeros((1, 5, ninc, 1, 1, 1, 1), dtype=dtype_int)
+    ps[0, 0] = postcode
+    ps[0, 2] = ncomp
+    return ps
+
+
+def generate(filename, nnode=10000, ninc=10, precision=1, layout='contiguous'):
+    dtype_int, dtype_float = ('i8', 'float64') if precision == 1 else ('i4', 'float32')
+    # 4 nodes per layer, one hexahedron between two layers
+    nlayer = max(nnode // 4, 2)
+    nnode = nlayer * 4
+    nelem = nlayer - 1
+    z = np.repeat(np.arange(nlayer, dtype='f8') / nlayer, 4)
+    ze = (np.arange(nelem, dtype='f8') + 0.5) / nlayer
+    with h5py.File(filename, 'w') as hdf:
+        g1 = hdf.create_group(marc_h5.MARC)
+        g1.attrs['precision'] = np.array([precision], dtype='i4')
+        g1.attrs['title'] = np.array([b'synthetic'])
+        g1.create_dataset('Summary', data=summary_table(ninc))
+        # model statistics: row 1 = # nodes, row 2 = # elements, ...
+        gs = np.zeros((20, 1, 1), dtype=dtype_int)
+        gs[0, 0, 0] = 1
+        gs[1, 0, 0] = nnode
+        gs[2, 0, 0] = nelem
+        gs[3, 0, 0] = 3
+        gs[4, 0, 0] = NIP
+        gs[8, 0, 0] = 3
+        gs[9, 0, 0] = 8
+        hdf.create_dataset(marc_h5.ANALYSIS_DATA, data=gs)
+        first = np.arange(nelem, dtype=dtype_int)[:, None] * 4 + 1
+        conn = np.hstack([first + np.arange(4), first + 4 + np.arange(4)])
+        hdf.create_dataset(marc_h5.CONNECTIVITY, data=conn)
+        hdf.create_dataset('Marc/Input/Node/Node ID', data=np.arange(1, nnode + 1, dtype=dtype_int))
+        hdf.create_dataset('Marc/Input/Element/Element ID', data=np.arange(1, nelem + 1, dtype=dtype_int))
+        #
+        # -----------------------------nodal displacements
+        shape = marc_h5.node_result_shape(nnode, 3, ninc)
+        disp = hdf.create_dataset(marc_h5.NODE + '/Displacement', shape=shape, dtype=dtype_float,
+                                  **marc_h5.result_storage(shape, dtype_float, layout))
+        disp.attrs.create('postcode', [1], dtype=dtype_int)
+        buf = np.empty(marc_h5.node_result_shape(nnode, 3, 1), dtype=dtype_float)
+        for i in range(ninc):
+            f = i / max(ninc - 1, 1)
+            buf[:, 0, 0, 0, 0, 0, 0] = 0.01 * f * np.sin(3.0 * z)
+            buf[:, 1, 0, 0, 0, 0, 0] = 0.02 * f * z * z
+            buf[:, 2, 0, 0, 0, 0, 0] = 0.001 * f * z
+            disp.write_direct(buf, dest_sel=marc_h5.node_sel(i))
+        hdf.create_dataset(marc_h5.NODE + '/' + marc_h5.NODE_POST_SUMMARY,
+                           data=post_summary(1, 3, ninc, dtype_int))
+        #
+        # -----------------------------element stresses
+        shape = marc_h5.element_result_shape(nelem, NIP, NCOMP_ELEMENT, ninc)
+        stress = hdf.create_dataset(marc_h5.ELEMENT + '/Stress', shape=shape, dtype=dtype_float,
+                                    **marc_h5.result_storage(shape, dtype_float, layout))
+        stress.attrs.create('postcode', [311], dtype=dtype_int)
+        buf = np.empty(marc_h5.element_result_shape(nelem, NIP, NCOMP_ELEMENT, 1), dtype=dtype_float)
+        ip = np.linspace(0.9, 1.1, NIP)
+        for i in range(ninc):
+            f = i / max(ninc - 1, 1)
+            for c in range(NCOMP_ELEMENT):
+                buf[:, :, c, 0, 0, 0, 0, 0] = 100.0 * f * (c + 1) * np.cos(2.0 * ze)[:, None] * ip
+            stress.write_direct(buf, dest_sel=marc_h5.element_sel(i))
+        hdf.create_dataset(marc_h5.ELEMENT + '/' + marc_h5.ELEMENT_POST_SUMMARY,
+                           data=post_summary(311, NCOMP_ELEMENT, ninc, dtype_int))
+    return nnode, nelem
+
+
+def main():
+    if len(sys.argv) > 1:
+        file = sys.argv[1]
+    else:
+        file = input("Enter HDF5 file : ")
+    nnode = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    ninc = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    precision = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+    nnode, nelem = generate(file, nnode, ninc, precision)
+    print(' Synthetic HDF5 file written: ', file)
+    print('  # Nodes:\t', nnode)
+    print('  # Elements:\t', nelem)
+    print('  # Increments:\t', ninc - 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,5 @@
 import numpy as np
 import tables as tb
-import math
 
 print('\n HDF5 Results File Processing')
 print(' ----------------------------\n')
@@ -108,7 +107,7 @@ with tb.open_file(file, 'a') as hdf:
 
     gd = hdf.get_node('/Marc/Results/Node')
 
-    disp = np.array(gd.Displacement.read())
+    disp = gd.Displacement
 
     # print('  Postcode: ', gd._v_attrs['postcode'])
     # print('  User_post_label: ', gd._v_attrs['user_post_label'])
@@ -122,19 +121,28 @@ with tb.open_file(file, 'a') as hdf:
     print('  # DoF:\t', ndof)
     print('  # Increments:\t', ninc - 1)
 
-    Resultant = np.zeros((nnode, 1, ninc, 1, 1, 1, 1))
+    # atoms in the file precision instead of Float64Atom / Int32Atom
+    float_atom = tb.Atom.from_dtype(np.dtype(dtype_float))
+    int_atom = tb.Atom.from_dtype(np.dtype(dtype_int))
 
-    for i in range(0, ninc):
-        i += 1
-
-        for k in range(0, nnode):
-            k += 1
+    if '/Marc/Results/Node/Resultant' in hdf:
+        hdf.remove_node('/Marc/Results/Node/Resultant', recursive=True)
+        print('\n  Old user result deleted...Resultant')
 
-            x = disp[k - 1, 0, i - 1, 0, 0, 0, 0]
-            y = disp[k - 1, 1, i - 1, 0, 0, 0, 0]
+    # chunks of one increment for many nodes (Mentat reads one increment
+    # at a time) with shuffle and zlib compression
+    filters = tb.Filters(complevel=4, complib='zlib', shuffle=True)
+    chunk_nodes = max(1, min(nnode, 1024 * 1024 // np.dtype(dtype_float).itemsize))
+    Resultant = hdf.create_carray('/Marc/Results/Node', 'Resultant', atom=float_atom,
+                                  shape=(nnode, 1, ninc, 1, 1, 1, 1), filters=filters,
+                                  chunkshape=(chunk_nodes, 1, 1, 1, 1, 1, 1))
 
-            mag = math.sqrt(x * x + y * y)
-            Resultant[k - 1, 0, i - 1, 0, 0, 0, 0] = mag
+    # one increment is read at a time, in the file precision
+    mag = np.empty(nnode, dtype=dtype_float)
+    for i in range(0, ninc):
+        xy = disp[:, 0:2, i, 0, 0, 0, 0]
+        np.hypot(xy[:, 0], xy[:, 1], out=mag)
+        Resultant[:, 0, i, 0, 0, 0, 0] = mag
 
     g3 = hdf.get_node('/Marc/Results/Node')
     node_post_summary = np.array(hdf.get_node('/Marc/Results/Node/Node Post Summary'))
@@ -176,15 +184,10 @@ with tb.open_file(file, 'a') as hdf:
         node_post_summary = np.append(node_post_summary, user_postcode, axis=0)
         print('\n  No user result detected - Appending new results')
 
-    if '/Marc/Results/Node/Resultant' in hdf:
-        hdf.remove_node('/Marc/Results/Node/Resultant', recursive=True)
-        print('\n  Old user result deleted...Resultant')
-
-    dset = hdf.create_carray('/Marc/Results/Node', 'Resultant', atom=tb.Float64Atom(), shape=Resultant.shape)
-    dset[:] = Resultant
+    dset = Resultant
     print('\n  New user result created...Resultant')
 
-    user_post = [-1]
+    user_post = np.array([-1], dtype=dtype_int)
     dset.attrs['postcode'] = user_post
     user_pst_lb = 'Resultant'
 
@@ -193,7 +196,7 @@ with tb.open_file(file, 'a') as hdf:
     # dset.attrs.create('user_post_label', user_pst_lb, atom=tid)
 
     hdf.remove_node('/Marc/Results/Node/Node Post Summary', recursive=True)
-    dset = hdf.create_carray('/Marc/Results/Node', 'Node Post Summary', atom=tb.Int32Atom(),
+    dset = hdf.create_carray('/Marc/Results/Node', 'Node Post Summary', atom=int_atom,
                              shape=node_post_summary.shape)
     dset[:] = node_post_summary
 